@@ -0,0 +1,163 @@
+"""
+长时间运行内存压测：持续转发不重复的消息，每轮结束后记录常驻内存 (RSS) 和各内部缓存的条目数，
+检查稳态下 RSS 是否有界 (后半程增长不超过阈值)，超出时以退出码 1 结束。
+
+    python bench_memory.py [--lean] [--rounds 30] [--messages 500] [--channels 40] [--max-growth-mb 8]
+
+--lean 等同于 LEAN_MODE=1 (最小 intents、不缓存成员、小消息缓存、更小的缓存上限)。
+工作负载：一半频道为 replace 模式、一半为镜像模式 (写入转发索引)，纯文本与多字段 Embed 混合，
+每条消息内容都不相同，翻译缓存和转发索引会一直写满并淘汰。
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import os
+import resource
+import sys
+import tempfile
+import time
+import types
+
+# 必须在导入 main 之前设置 (bench_pipeline 会导入 main)
+if '--lean' in sys.argv:
+    os.environ['LEAN_MODE'] = '1'
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='translator-membench-'))
+os.environ.setdefault('RELAY_INDEX_PERSIST', '0')
+
+import bench_pipeline as bench
+import main
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def rss_bytes():
+    """当前 RSS；没有 /proc 时退回到 ru_maxrss (峰值，只能作为上界参考)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class CountingWebhook:
+    """只计数、不保存发送内容；wait=True 时返回带 ID 的消息对象 (镜像模式需要)"""
+    ids = itertools.count(10 ** 9)
+
+    def __init__(self, webhook_id):
+        self.id = webhook_id
+        self.token = 'bench'
+        self.sent = 0
+
+    async def send(self, **kwargs):
+        self.sent += 1
+        return types.SimpleNamespace(id=next(self.ids)) if kwargs.get('wait') else None
+
+    async def edit_message(self, message_id, **kwargs):
+        pass
+
+    async def delete_message(self, message_id):
+        pass
+
+def build_channels(count):
+    human = bench.FakeAuthor(1001, 'trader', False)
+    news_bot = bench.FakeAuthor(2002, 'NewsBot', True)
+    channels = [bench.FakeChannel(5000 + n) for n in range(count)]
+    config = {section: {} for section in main.global_config}
+    for n, ch in enumerate(channels):
+        config["channel_modes"][str(ch.id)] = 'mirror' if n % 2 else 'replace'
+        config["bot_mappings"][str(ch.id)] = {str(news_bot.id): {'name': 'Relay', 'avatar': None}}
+    return channels, config, human, news_bot
+
+def install(channels, config):
+    main.global_config.clear()
+    main.global_config.update(config)
+    main.rebuild_routing_index()
+    main.bot.get_channel = {ch.id: ch for ch in channels}.get
+    webhooks = []
+    for ch in channels:
+        wh = CountingWebhook(900000 + ch.id)
+        main.webhook_registry._remember(ch.id, wh)
+        main.webhook_registry._owners[wh.id] = ch.id
+        main.own_webhook_ids.add(wh.id)
+        webhooks.append(wh)
+    return webhooks
+
+def cache_sizes():
+    return {
+        'translation_cache': len(main.translation_cache._data),
+        'relay_index': len(main.relay_index._data),
+        'webhooks': len(main.webhook_registry._live),
+        'metric_channels': len(main.metrics._channels),
+        'preview_waiters': len(main.preview_waiters),
+        'channel_queues': len(main.channel_dispatcher._queues),
+    }
+
+async def run_round(round_no, args, channels, human, news_bot):
+    base = round_no * args.messages
+    messages = []
+    for i in range(base, base + args.messages):
+        ch = channels[i % len(channels)]
+        if i % 3 == 2:
+            msg = bench.FakeMessage(i, ch, news_bot, embeds=[bench.rich_embed(i, fields=6)])
+        else:
+            msg = bench.FakeMessage(i, ch, human, f"{bench.HEADLINES[i % len(bench.HEADLINES)]} (ref {i})")
+        messages.append(msg)
+        await main.on_message(msg)
+    await main.channel_dispatcher.join()
+    await main.outbound.join()
+    # 镜像频道：删除其中一部分原消息，走转发索引的删除同步
+    for msg in messages[1::10]:
+        await main.on_raw_message_delete(types.SimpleNamespace(message_id=msg.id, channel_id=msg.channel.id))
+    await main.channel_dispatcher.join()
+    await main.outbound.join()
+
+async def run(args):
+    main.bot.process_commands = bench._ignore_commands
+    main.get_translation_backend().latency = args.latency_ms / 1000
+    channels, config, human, news_bot = build_channels(args.channels)
+    webhooks = install(channels, config)
+
+    print(f"省内存模式 {'开' if main.LEAN_MODE else '关'} | 每轮 {args.messages} 条 × {args.rounds} 轮 | {args.channels} 个频道 | "
+          f"缓存上限: 翻译 {main.TRANSLATION_CACHE_SIZE} / 转发索引 {main.RELAY_INDEX_SIZE} / webhook {main.WEBHOOK_CACHE_SIZE}")
+    print(f"{'轮次':<6}{'RSS MB':>9}{'耗时s':>8}{'翻译缓存':>10}{'转发索引':>10}{'webhook':>9}{'频道指标':>10}")
+    samples = []
+    for round_no in range(args.rounds):
+        start = time.perf_counter()
+        await run_round(round_no, args, channels, human, news_bot)
+        gc.collect()
+        rss = rss_bytes()
+        samples.append(rss)
+        sizes = cache_sizes()
+        print(f"{round_no + 1:<6}{rss / 1024 / 1024:>9.1f}{time.perf_counter() - start:>8.2f}{sizes['translation_cache']:>10}"
+              f"{sizes['relay_index']:>10}{sizes['webhooks']:>9}{sizes['metric_channels']:>10}")
+    await main.close_translation_backend()
+
+    sizes = cache_sizes()
+    over = [name for name, size, cap in [
+        ('translation_cache', sizes['translation_cache'], main.TRANSLATION_CACHE_SIZE),
+        ('relay_index', sizes['relay_index'], main.RELAY_INDEX_SIZE),
+        ('webhooks', sizes['webhooks'], main.WEBHOOK_CACHE_SIZE),
+        ('metric_channels', sizes['metric_channels'], main.METRICS_MAX_CHANNELS),
+    ] if size > cap]
+    half = len(samples) // 2
+    growth = (samples[-1] - samples[half]) / 1024 / 1024 if half else 0.0
+    print(f"发送 {sum(wh.sent for wh in webhooks)} 条 | 后半程 RSS 增长 {growth:+.1f}MB (阈值 {args.max_growth_mb}MB) | "
+          f"峰值 {max(samples) / 1024 / 1024:.1f}MB")
+    if over:
+        print(f"❌ 缓存超过上限: {', '.join(over)}")
+    if growth > args.max_growth_mb:
+        print("❌ 稳态 RSS 持续增长")
+    return 1 if over or growth > args.max_growth_mb else 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='长时间运行内存压测')
+    parser.add_argument('--lean', action='store_true', help='以省内存模式运行 (LEAN_MODE=1)')
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--messages', type=int, default=500, help='每轮消息数')
+    parser.add_argument('--channels', type=int, default=40)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='stub 翻译后端每次请求的延迟')
+    parser.add_argument('--max-growth-mb', type=float, default=8.0, help='后半程允许的 RSS 增长')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(parse_args())))
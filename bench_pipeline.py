@@ -0,0 +1,259 @@
+"""
+离线端到端压测：on_message -> process_message_content -> apply_output_style -> send_translated_content
+
+    python bench_pipeline.py [--messages 200] [--latency-ms 80] [--rate 0] [--scenario all] [--no-memory]
+
+不连接 Discord、不调用翻译 API：使用伪造的 Message / Embed / TextChannel、记录发送内容的替身 webhook，
+以及可配置延迟的 stub 翻译后端 (TRANSLATE_BACKEND=stub)。每个场景报告吞吐、端到端 p50/p99 延迟和峰值内存。
+
+场景：
+  plain_flood     单频道纯文本刷屏 (replace 模式)
+  embed_heavy     机器人发布的多字段 Embed (bot 映射)
+  mixed_channels  20 个频道混合：英文/中文/短消息/Embed
+  link_previews   带链接的消息，预览在稍后的编辑事件中到达
+  fan_out         单频道译为 zh-CN / ja / ko 三种语言，分别发往三个频道
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+# 必须在导入 main 之前设置
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='translator-bench-'))
+os.environ.setdefault('TRANSLATE_BACKEND', 'stub')
+os.environ.setdefault('TRANSLATION_CACHE_PERSIST', '0')
+os.environ.setdefault('WEBHOOK_RATE_LIMIT', '100000/1')
+os.environ.setdefault('DELETE_RATE_LIMIT', '100000/1')
+
+import discord
+import main
+
+REF_RE = re.compile(r'ref (\d+)')
+
+HEADLINES = [
+    "Fed holds rates steady and signals two cuts later this year",
+    "NVIDIA shares jump in premarket after earnings beat estimates",
+    "Oil prices climb as OPEC extends production cuts into next quarter",
+    "Tesla recalls two million vehicles over Autopilot safety concerns",
+    "Bitcoin ETF inflows hit a record on Monday, led by the largest issuers",
+    "Japan's Nikkei closes higher as the yen weakens past a key level",
+]
+
+# ==================== 伪造的 Discord 对象 ====================
+
+class FakeChannel(discord.TextChannel):
+    """通过 isinstance(discord.TextChannel) 检查的最小频道对象"""
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+class FakeAuthor:
+    def __init__(self, author_id, name, is_bot):
+        self.id = author_id
+        self.display_name = name
+        self.avatar = None
+        self.bot = is_bot
+
+class FakeMessage:
+    def __init__(self, message_id, channel, author, content="", embeds=None):
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.embeds = embeds or []
+        self.attachments = []
+        self.webhook_id = None
+        self.flags = discord.MessageFlags()
+        self.deleted = False
+
+    async def delete(self):
+        self.deleted = True
+
+class StubWebhook:
+    """记录每次发送的时间和内容"""
+
+    def __init__(self, webhook_id):
+        self.id = webhook_id
+        self.token = 'bench'
+        self.sent = []
+
+    async def send(self, **kwargs):
+        text = kwargs.get('content') or ''
+        for embed in kwargs.get('embeds') or []:
+            text += ' ' + ' '.join(filter(None, [embed.title, embed.description, embed.footer.text]))
+            text += ' ' + ' '.join(f"{f.name} {f.value}" for f in embed.fields)
+        self.sent.append((time.perf_counter(), text))
+
+# ==================== 工作负载 ====================
+
+def rich_embed(ref, fields=10):
+    embed = discord.Embed(title=HEADLINES[ref % len(HEADLINES)], description=f"{HEADLINES[(ref + 1) % len(HEADLINES)]} (ref {ref})",
+                          color=0x3498db, type='rich')
+    embed.set_footer(text="Powered by the market news relay service")
+    for i in range(fields):
+        embed.add_field(name=f"Metric number {i} for this report", value=f"The value moved higher by {i}.5 percent today")
+    return embed
+
+def build_workload(scenario, count):
+    """返回 (频道列表, 配置, [(消息, 预览延迟秒或 None)])"""
+    human = FakeAuthor(1001, 'trader', False)
+    news_bot = FakeAuthor(2002, 'NewsBot', True)
+    config = {section: {} for section in main.global_config}
+    items = []
+
+    if scenario == 'plain_flood':
+        channels = [FakeChannel(10)]
+        config["channel_modes"]["10"] = 'replace'
+        for i in range(count):
+            items.append((FakeMessage(i, channels[0], human, f"{HEADLINES[i % len(HEADLINES)]} (ref {i})"), None))
+
+    elif scenario == 'embed_heavy':
+        channels = [FakeChannel(20), FakeChannel(21)]
+        for ch in channels:
+            config["bot_mappings"][str(ch.id)] = {str(news_bot.id): {'name': 'Relay', 'avatar': None}}
+        for i in range(count):
+            items.append((FakeMessage(i, channels[i % 2], news_bot, embeds=[rich_embed(i)]), None))
+
+    elif scenario == 'mixed_channels':
+        channels = [FakeChannel(100 + n) for n in range(20)]
+        styles = ['auto', 'flat', 'embed']
+        for n, ch in enumerate(channels):
+            config["channel_modes"][str(ch.id)] = 'replace'
+            config["output_styles"][str(ch.id)] = styles[n % 3]
+        for i in range(count):
+            ch = channels[i % len(channels)]
+            kind = i % 4
+            if kind == 0: msg = FakeMessage(i, ch, human, f"{HEADLINES[i % len(HEADLINES)]} (ref {i})")
+            elif kind == 1: msg = FakeMessage(i, ch, human, f"今天市场大涨，科技股领涨 (ref {i})")
+            elif kind == 2: msg = FakeMessage(i, ch, human, "ok")
+            else: msg = FakeMessage(i, ch, news_bot, embeds=[rich_embed(i, fields=4)])
+            items.append((msg, None))
+
+    elif scenario == 'link_previews':
+        channels = [FakeChannel(30 + n) for n in range(5)]
+        for ch in channels:
+            config["channel_modes"][str(ch.id)] = 'replace'
+        for i in range(count):
+            msg = FakeMessage(i, channels[i % 5], human, f"{HEADLINES[i % len(HEADLINES)]} https://example.com/news/{i} (ref {i})")
+            items.append((msg, 0.05 + (i % 5) * 0.05))
+
+    elif scenario == 'fan_out':
+        channels = [FakeChannel(40), FakeChannel(41), FakeChannel(42), FakeChannel(43)]
+        config["channel_modes"]["40"] = 'replace'
+        config["target_languages"]["40"] = {'zh-CN': '41', 'ja': '42', 'ko': '43'}
+        for i in range(count):
+            items.append((FakeMessage(i, channels[0], human, f"{HEADLINES[i % len(HEADLINES)]} (ref {i})"), None))
+    else:
+        raise ValueError(scenario)
+    return channels, config, items
+
+async def deliver_preview(message, delay):
+    await asyncio.sleep(delay)
+    preview = discord.Embed(title="Example News", type='link')
+    preview.set_thumbnail(url=f"https://example.com/thumb/{message.id}.png")
+    payload = types.SimpleNamespace(message_id=message.id, channel_id=message.channel.id, message=types.SimpleNamespace(embeds=[preview]))
+    await main.on_raw_message_edit(payload)
+    # 与 discord.py 一致：raw 事件分发后，缓存中的消息对象被原地更新
+    message.embeds = [preview]
+
+# ==================== 运行 ====================
+
+def reset_state(channels, config):
+    main.global_config.clear()
+    main.global_config.update(config)
+    main.rebuild_routing_index()
+    main.translation_cache._data.clear()
+    main.translation_cache.hits = main.translation_cache.misses = 0
+    webhooks = {}
+    main.bot.get_channel = {ch.id: ch for ch in channels}.get
+    for ch in channels:
+        wh = webhooks[ch.id] = StubWebhook(900000 + ch.id)
+        main.webhook_registry._live[ch.id] = wh
+        main.webhook_registry._owners[wh.id] = ch.id
+        main.own_webhook_ids.add(wh.id)
+    return webhooks
+
+async def run_scenario(scenario, count, rate):
+    channels, config, items = build_workload(scenario, count)
+    webhooks = reset_state(channels, config)
+    backend = main.get_translation_backend()
+    requests_before, chars_before = backend.requests, backend.characters
+    arrivals = {}
+    preview_tasks = []
+
+    start = time.perf_counter()
+    for n, (message, preview_delay) in enumerate(items):
+        if rate:
+            await asyncio.sleep(max(0.0, start + n / rate - time.perf_counter()))
+        arrivals[message.id] = time.perf_counter()
+        if preview_delay is not None:
+            preview_tasks.append(asyncio.create_task(deliver_preview(message, preview_delay)))
+        await main.on_message(message)
+    await main.channel_dispatcher.join()
+    await main.outbound.join()
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*preview_tasks)
+
+    latencies = []
+    for wh in webhooks.values():
+        for sent_at, text in wh.sent:
+            ref = REF_RE.search(text)
+            if ref and int(ref.group(1)) in arrivals:
+                latencies.append(sent_at - arrivals[int(ref.group(1))])
+    latencies.sort()
+    sent = sum(len(wh.sent) for wh in webhooks.values())
+    return {
+        'messages': count, 'sent': sent, 'elapsed': elapsed,
+        'throughput': count / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.50), 'p99': percentile(latencies, 0.99),
+        'api_requests': backend.requests - requests_before, 'api_chars': backend.characters - chars_before,
+    }
+
+def percentile(values, q):
+    if not values: return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def measure_peak_memory(scenario, count, rate):
+    tracemalloc.start()
+    try:
+        await run_scenario(scenario, count, rate)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+async def run(args):
+    main.bot.process_commands = _ignore_commands
+    backend = main.get_translation_backend()
+    backend.latency = args.latency_ms / 1000
+    scenarios = ['plain_flood', 'embed_heavy', 'mixed_channels', 'link_previews', 'fan_out'] if args.scenario == 'all' else [args.scenario]
+
+    print(f"消息数 {args.messages} | 翻译延迟 {args.latency_ms:.0f}ms | 到达速率 {args.rate or '突发'} | "
+          f"并发上限 {main.MAX_CONCURRENT_MESSAGES} | 微批窗口 {main.TRANSLATE_BATCH_WINDOW_MS}ms")
+    print(f"{'场景':<16}{'发送':>6}{'耗时s':>8}{'msg/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'API请求':>9}{'API字符':>10}{'峰值内存':>11}")
+    for scenario in scenarios:
+        result = await run_scenario(scenario, args.messages, args.rate)
+        peak = '-' if args.no_memory else f"{await measure_peak_memory(scenario, args.messages, args.rate) / 1024 / 1024:.1f}MB"
+        print(f"{scenario:<16}{result['sent']:>6}{result['elapsed']:>8.2f}{result['throughput']:>9.1f}"
+              f"{result['p50'] * 1000:>9.1f}{result['p99'] * 1000:>9.1f}{result['api_requests']:>9}{result['api_chars']:>10}{peak:>11}")
+    await main.close_translation_backend()
+
+async def _ignore_commands(message):
+    pass
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='离线端到端压测')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=80.0, help='stub 翻译后端每次请求的延迟')
+    parser.add_argument('--rate', type=float, default=0.0, help='每秒到达的消息数，0 表示一次性突发')
+    parser.add_argument('--scenario', default='all',
+                        choices=['all', 'plain_flood', 'embed_heavy', 'mixed_channels', 'link_previews', 'fan_out'])
+    parser.add_argument('--no-memory', action='store_true', help='跳过 tracemalloc 峰值内存测量')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,93 @@
+"""
+文本预处理微基准：对比原 clean_text + 提及保护 (多次 re.sub / replace) 与单次扫描的 preprocess_text。
+
+    python bench_preprocess.py [重复次数]
+
+使用 bench_corpus.json 中的转发消息语料，检查两者输出一致 (清洗结果 + 占位符还原结果)，并报告耗时。
+代码块/行内代码现在整体保护、不再去除其中的 URL，属于预期差异，会单独列出。
+"""
+import json
+import os
+import re
+import sys
+import time
+
+from main import preprocess_text, restore_tokens
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_corpus.json')
+
+# ==================== 原实现 (作为对照) ====================
+
+def legacy_clean_text(text):
+    if not text: return ""
+    text = re.sub(r'\[([^\]]*)\]\(https?://\S+\)', r'\1', text)
+    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    text = text.replace('[](', '').replace('[]', '')
+    text = re.sub(r'\[\s*\]\(\s*\)', '', text)
+    text = re.sub(r'\[\s*\]', '', text)
+    text = text.replace('📷', '')
+    return text.strip()
+
+def legacy_protect(text):
+    mention_placeholders = {}
+    counter = 0
+    for mention in ['@everyone', '@here']:
+        placeholder = f"@@PROTECTED_MENTION_{counter}@@"
+        text = text.replace(mention, placeholder)
+        mention_placeholders[placeholder] = mention
+        counter += 1
+
+    def protect_mention(match):
+        nonlocal counter
+        placeholder = f"@@PROTECTED_MENTION_{counter}@@"
+        mention_placeholders[placeholder] = match.group(0)
+        counter += 1
+        return placeholder
+
+    return re.sub(r'<@!?&?\d+>', protect_mention, text), mention_placeholders
+
+def legacy_restore(text, mention_placeholders):
+    for placeholder, original in mention_placeholders.items():
+        text = text.replace(placeholder, original)
+    return text
+
+def legacy_pipeline(text):
+    protected, placeholders = legacy_protect(legacy_clean_text(text))
+    return legacy_restore(protected, placeholders)
+
+def new_pipeline(text):
+    return restore_tokens(*preprocess_text(text))
+
+# ==================== 基准 ====================
+
+def measure(func, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            func(text)
+    return (time.perf_counter() - start) / (repeat * len(corpus)) * 1e6
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with open(CORPUS_FILE, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    mismatches, expected = [], []
+    for text in corpus:
+        old, new = legacy_pipeline(text), new_pipeline(text)
+        if old != new:
+            (expected if '`' in text else mismatches).append((text, old, new))
+
+    legacy_us = measure(legacy_pipeline, corpus, repeat)
+    new_us = measure(new_pipeline, corpus, repeat)
+
+    print(f"语料: {len(corpus)} 条, 重复 {repeat} 次")
+    print(f"原实现 (clean_text + 提及保护 + 还原): {legacy_us:8.2f} µs/条")
+    print(f"单次扫描 (preprocess_text + 还原):     {new_us:8.2f} µs/条  ({legacy_us / new_us:.2f}x)")
+    print(f"输出一致: {len(corpus) - len(mismatches) - len(expected)}/{len(corpus)}, 预期差异 (代码片段): {len(expected)}")
+    for text, old, new in mismatches:
+        print(f"❌ 不一致:\n   输入: {text!r}\n   原:   {old!r}\n   新:   {new!r}")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+分片启动器：启动多个 main.py 进程，每个进程负责一段连续的分片 (AutoShardedBot + SHARD_IDS)，
+把消息预处理、JSON 等 CPU 工作分散到多个核上；子进程退出后按指数退避自动重启。
+
+    python launcher.py [--shards auto] [--processes 0] [--metrics-port 0]
+
+所有进程共用 DATA_DIR：配置文件在文件锁内合并写入、各进程轮询 mtime 同步；
+翻译缓存使用共享的 SQLite 层 (分片模式默认开启)。
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+STABLE_AFTER = 60.0  # 运行超过这么多秒后再退出，视为偶发故障，重置退避
+MAX_BACKOFF = 60.0
+SHUTDOWN_TIMEOUT = 30.0
+
+logger = logging.getLogger('launcher')
+
+def recommended_shards(token):
+    """向 Discord 查询推荐的分片数"""
+    request = urllib.request.Request('https://discord.com/api/v10/gateway/bot', headers={
+        'Authorization': f'Bot {token}', 'User-Agent': 'DiscordBot (translator-launcher, 1.0)'
+    })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+def split_shards(shard_count, processes):
+    """把分片按连续区间分给各进程：split_shards(5, 2) -> [[0, 1, 2], [3, 4]]"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+class ShardProcess:
+    def __init__(self, index, shard_ids, shard_count, metrics_port):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.metrics_port = metrics_port
+        self.proc = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+
+    def start(self):
+        env = dict(os.environ, SHARD_COUNT=str(self.shard_count), SHARD_IDS=','.join(map(str, self.shard_ids)))
+        if self.metrics_port: env['METRICS_PORT'] = str(self.metrics_port + self.index)
+        self.proc = subprocess.Popen([sys.executable, MAIN_PATH], env=env)
+        self.started_at = time.monotonic()
+        logger.info(f"🚀 进程 {self.index} 已启动 (pid {self.proc.pid})，分片 {self.shard_ids}")
+
+    def check(self):
+        """子进程已退出则安排重启 (指数退避)"""
+        now = time.monotonic()
+        if self.proc is not None:
+            code = self.proc.poll()
+            if code is None: return
+            if now - self.started_at > STABLE_AFTER: self.restarts = 0
+            delay = min(MAX_BACKOFF, 2 ** self.restarts)
+            self.restarts += 1
+            self.proc = None
+            self.next_start = now + delay
+            logger.warning(f"⚠️ 进程 {self.index} 退出 (code {code})，{delay:.0f} 秒后重启")
+        if now >= self.next_start:
+            self.start()
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGTERM)
+
+    def wait(self, deadline):
+        if not self.proc: return
+        try:
+            self.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning(f"⚠️ 进程 {self.index} 未能按时退出，强制结束")
+            self.proc.kill()
+            self.proc.wait()
+
+def supervise(workers):
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+    for worker in workers:
+        worker.start()
+    while not stopping:
+        time.sleep(1)
+        for worker in workers:
+            if not stopping: worker.check()
+
+    logger.info("🛑 正在停止所有分片进程...")
+    for worker in workers:
+        worker.stop()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    for worker in workers:
+        worker.wait(deadline)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='分片启动器')
+    parser.add_argument('--shards', default=os.getenv('SHARD_COUNT', 'auto'), help="总分片数，auto 表示使用 Discord 推荐值")
+    parser.add_argument('--processes', type=int, default=int(os.getenv('SHARD_PROCESSES', '0')),
+                        help='进程数，0 表示按 CPU 核数')
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', '0')),
+                        help='非 0 时第 i 个进程的 /metrics 使用端口 metrics-port + i')
+    return parser.parse_args()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    args = parse_args()
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        logger.error('❌ 错误: 未设置 DISCORD_TOKEN')
+        return 1
+    shard_count = recommended_shards(token) if args.shards == 'auto' else int(args.shards)
+    processes = args.processes or os.cpu_count() or 1
+    groups = split_shards(shard_count, processes)
+    logger.info(f"🧩 共 {shard_count} 个分片，{len(groups)} 个进程")
+    supervise([ShardProcess(i, ids, shard_count, args.metrics_port) for i, ids in enumerate(groups)])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
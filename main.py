@@ -3,163 +3,1382 @@ from discord.ext import commands
 import asyncio
 import os
 import json
-from google.cloud import translate_v2 as translate
-from google.oauth2 import service_account
+import aiohttp
 import re
 import functools
+import threading
+import time
+import random
+import sys
+import signal
+import bisect
+import atexit
+import logging
+import logging.handlers
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from queue import SimpleQueue
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Optional, Union
+try:
+    import fcntl
+except ImportError:  # Windows：没有跨进程文件锁，只支持单进程运行
+    fcntl = None
 
 # ==================== 配置区域 ====================
 TOKEN = os.getenv('DISCORD_TOKEN')
 MIN_WORDS = 5
-DEBUG = True
+DEBUG = os.getenv('DEBUG', '0') == '1'
+# 省内存模式：最小 intents、不缓存成员、消息缓存很小，各内部缓存使用更小的默认上限 (小内存容器)
+LEAN_MODE = os.getenv('LEAN_MODE', '0') == '1'
+LEAN_MAX_MESSAGES = int(os.getenv('LEAN_MAX_MESSAGES', '100')) or None  # 0 表示完全关闭消息缓存
+
+# 翻译后端：rest / sdk / stub；REST 可用 API Key 或 GOOGLE_APPLICATION_CREDENTIALS 服务账号
+TRANSLATE_BACKEND = os.getenv('TRANSLATE_BACKEND', 'rest')
+GOOGLE_TRANSLATE_API_KEY = os.getenv('GOOGLE_TRANSLATE_API_KEY')
+STUB_TRANSLATE_LATENCY_MS = float(os.getenv('STUB_TRANSLATE_LATENCY_MS', '0'))
+# 未用 /add_language 设置目标语言的频道默认译为
+DEFAULT_TARGET_LANGUAGE = 'zh-CN'
+# 单次翻译请求超时 (秒)、最多重试次数、退避基数/上限 (秒)；连续失败多少次熔断、熔断多久后探测恢复
+TRANSLATE_TIMEOUT = float(os.getenv('TRANSLATE_TIMEOUT', '5'))
+TRANSLATE_RETRIES = int(os.getenv('TRANSLATE_RETRIES', '2'))
+TRANSLATE_BACKOFF_BASE = float(os.getenv('TRANSLATE_BACKOFF_BASE', '0.3'))
+TRANSLATE_BACKOFF_MAX = float(os.getenv('TRANSLATE_BACKOFF_MAX', '2'))
+TRANSLATE_BREAKER_THRESHOLD = int(os.getenv('TRANSLATE_BREAKER_THRESHOLD', '5'))
+TRANSLATE_BREAKER_RESET = float(os.getenv('TRANSLATE_BREAKER_RESET', '30'))
+
+# 链接预览最长等待秒数 (由消息编辑事件提前唤醒)
+PREVIEW_WAIT_TIMEOUT = float(os.getenv('PREVIEW_WAIT_TIMEOUT', '3.0'))
+
+# 消息处理并发：跨频道最多同时处理的消息数 / 单频道队列长度 / 队列满时的策略 (defer, drop_oldest, drop_newest)
+MAX_CONCURRENT_MESSAGES = int(os.getenv('MAX_CONCURRENT_MESSAGES', '16'))
+CHANNEL_QUEUE_SIZE = int(os.getenv('CHANNEL_QUEUE_SIZE', '100'))
+QUEUE_OVERFLOW_POLICY = os.getenv('QUEUE_OVERFLOW_POLICY', 'defer')
+
+# 出站限流：每个 webhook 的发送速率、每个频道的删除速率 ('次数/秒数')，以及每个桶的队列长度
+WEBHOOK_RATE_LIMIT = os.getenv('WEBHOOK_RATE_LIMIT', '5/2')
+DELETE_RATE_LIMIT = os.getenv('DELETE_RATE_LIMIT', '5/1')
+OUTBOUND_QUEUE_SIZE = int(os.getenv('OUTBOUND_QUEUE_SIZE', '200'))
+
+# 分片：SHARD_COUNT 为总分片数，SHARD_IDS 为本进程负责的分片 (逗号分隔)，通常由 launcher.py 设置；
+# 未设置时单进程运行。多进程时配置通过文件合并写入 + mtime 轮询同步 (秒)
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(i) for i in os.getenv('SHARD_IDS', '').split(',') if i.strip()] or None
+CONFIG_SYNC_INTERVAL = float(os.getenv('CONFIG_SYNC_INTERVAL', '2'))
+SHARD_SUFFIX = f"-shard{'_'.join(map(str, SHARD_IDS))}" if SHARD_COUNT and SHARD_IDS else ''
 
 # 适配 Railway 的持久化存储
 DATA_DIR = os.getenv('DATA_DIR', '.') 
 CONFIG_FILE = os.path.join(DATA_DIR, 'bot_config.json')
+WEBHOOK_FILE = os.path.join(DATA_DIR, f'webhooks{SHARD_SUFFIX}.json')  # 各分片进程的频道互不重叠，各存一份
+# 上次同步到 Discord 的 Slash 命令定义哈希，未变化时启动不再调用 tree.sync()
+COMMAND_HASH_FILE = os.path.join(DATA_DIR, 'command_tree.sha256')
+# 配置修改后延迟多少秒合并写盘
+CONFIG_SAVE_DELAY = float(os.getenv('CONFIG_SAVE_DELAY', '1.0'))
+
+# 镜像模式的原消息 -> 译文消息索引：内存条数上限 / 是否同时落盘到 SQLite / 磁盘记录保留天数
+RELAY_INDEX_SIZE = int(os.getenv('RELAY_INDEX_SIZE', '1000' if LEAN_MODE else '5000'))
+RELAY_INDEX_PERSIST = os.getenv('RELAY_INDEX_PERSIST', '1') == '1'
+RELAY_INDEX_RETENTION_DAYS = float(os.getenv('RELAY_INDEX_RETENTION_DAYS', '7'))
+RELAY_INDEX_FILE = os.path.join(DATA_DIR, 'relay_index.sqlite3')
+
+# 翻译缓存：条数上限 / 过期秒数 / 是否落盘到 DATA_DIR
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '1000' if LEAN_MODE else '5000'))
+TRANSLATION_CACHE_TTL = int(os.getenv('TRANSLATION_CACHE_TTL', '86400'))
+TRANSLATION_CACHE_PERSIST = os.getenv('TRANSLATION_CACHE_PERSIST', '1') == '1'
+TRANSLATION_CACHE_FILE = os.path.join(DATA_DIR, 'translation_cache.json')
+# 多进程共享的 SQLite 缓存层 (分片模式默认开启，此时不再写 JSON 缓存文件)
+TRANSLATION_CACHE_SHARED = os.getenv('TRANSLATION_CACHE_SHARED', '1' if SHARD_COUNT else '0') == '1'
+TRANSLATION_CACHE_DB = os.path.join(DATA_DIR, 'translation_cache.sqlite3')
+TRANSLATION_CACHE_SHARED_SIZE = int(os.getenv('TRANSLATION_CACHE_SHARED_SIZE', '50000'))  # 共享层行数上限
+
+# 批量翻译：单次请求最多段数 / 字符数，以及同时进行的请求数
+TRANSLATE_BATCH_SIZE = int(os.getenv('TRANSLATE_BATCH_SIZE', '128'))
+TRANSLATE_BATCH_CHARS = int(os.getenv('TRANSLATE_BATCH_CHARS', '5000'))
+TRANSLATE_CONCURRENCY = int(os.getenv('TRANSLATE_CONCURRENCY', '4'))
+# 跨消息微批窗口 (毫秒)：忙时最多等这么久攒批，空闲时立即发出
+TRANSLATE_BATCH_WINDOW_MS = float(os.getenv('TRANSLATE_BATCH_WINDOW_MS', '5'))
+
+# 指标：设置端口后在本地开启 Prometheus 文本格式的 /metrics；按频道细分的标签数上限
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_MAX_CHANNELS = int(os.getenv('METRICS_MAX_CHANNELS', '50' if LEAN_MODE else '200'))
+# 内存中保留的频道 webhook 对象上限 (超出的按 LRU 淘汰，需要时从已保存的 ID/token 重建，不发请求)
+WEBHOOK_CACHE_SIZE = int(os.getenv('WEBHOOK_CACHE_SIZE', '200' if LEAN_MODE else '2000'))
+
+if LEAN_MODE:
+    # 只订阅转发需要的事件：服务器/频道结构和服务器消息 (含编辑/删除)
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    client_options = {'max_messages': LEAN_MAX_MESSAGES, 'member_cache_flags': discord.MemberCacheFlags.none(),
+                      'chunk_guilds_at_startup': False}
+else:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    client_options = {}
+if SHARD_COUNT:
+    client_options.update(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+
+class TranslatorBot(commands.AutoShardedBot if SHARD_COUNT else commands.Bot):
+    """一次性的启动工作放在 setup_hook (登录后、连接网关前只执行一次)；
+    on_ready 每次网关重连都会触发，只做轻量工作。设置了 SHARD_COUNT 时本进程只连接 SHARD_IDS 中的分片"""
+
+    async def setup_hook(self):
+        await initialize()
+
+bot = TranslatorBot(command_prefix='!', intents=intents, **client_options)
+
+# ==================== 日志 ====================
+# 日志记录只放进内存队列，由后台线程写 stdout，热路径上不做同步 IO
+logger = logging.getLogger('translator')
+
+def setup_logging():
+    log_queue = SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+
+setup_logging()
+
+# ==================== 指标 ====================
+
+class Metrics:
+    """进程内指标：各阶段的延迟直方图和计数器 (可按频道细分) 以及即时读取的 gauge，
+    以 Prometheus 文本格式导出。只在事件循环线程上更新，无需加锁"""
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, max_channels):
+        self.max_channels = max_channels
+        self._channels = set()
+        self._histograms = {}  # (阶段, 频道) -> [各桶计数 (含 +Inf)..., 总和, 次数]
+        self._counters = {}    # (名称, 频道) -> 值
+        self._gauges = {}      # 名称 -> 无参函数
+
+    def _label(self, channel):
+        """频道标签数量有上限，超出部分归入 other，避免大服务器下指标无限增长"""
+        if channel is None: return ''
+        channel = str(channel)
+        if channel not in self._channels:
+            if len(self._channels) >= self.max_channels: return 'other'
+            self._channels.add(channel)
+        return channel
+
+    def observe(self, stage, seconds, channel=None):
+        key = (stage, self._label(channel))
+        hist = self._histograms.get(key)
+        if hist is None:
+            hist = self._histograms[key] = [0] * (len(self.BUCKETS) + 3)
+        hist[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+    @contextmanager
+    def timer(self, stage, channel=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, channel)
+
+    def inc(self, name, value=1, channel=None):
+        key = (name, self._label(channel))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, func):
+        self._gauges[name] = func
+
+    def render(self):
+        lines = ['# TYPE translator_stage_seconds histogram']
+        bounds = [str(b) for b in self.BUCKETS] + ['+Inf']
+        for (stage, channel), hist in sorted(self._histograms.items()):
+            labels = f'stage="{stage}"' + (f',channel="{channel}"' if channel else '')
+            cumulative = 0
+            for bound, count in zip(bounds, hist):
+                cumulative += count
+                lines.append(f'translator_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'translator_stage_seconds_sum{{{labels}}} {hist[-2]:.6f}')
+            lines.append(f'translator_stage_seconds_count{{{labels}}} {hist[-1]}')
+        last_name = None
+        for (name, channel), value in sorted(self._counters.items()):
+            if name != last_name:
+                lines.append(f'# TYPE translator_{name}_total counter')
+                last_name = name
+            labels = f'{{channel="{channel}"}}' if channel else ''
+            lines.append(f'translator_{name}_total{labels} {value}')
+        for name, func in sorted(self._gauges.items()):
+            lines.append(f'# TYPE translator_{name} gauge')
+            lines.append(f'translator_{name} {func()}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(METRICS_MAX_CHANNELS)
+
+async def start_metrics_server():
+    """METRICS_PORT 非 0 时在本地开启 /metrics，返回 runner 供退出时清理"""
+    if not METRICS_PORT: return None
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(body=metrics.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    logger.info(f"📈 指标已开启: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+# ==================== 翻译后端 ====================
+# 通过 TRANSLATE_BACKEND 选择：rest (默认，异步 + 连接池) / sdk (原 google-cloud-translate 客户端) / stub (本地替身)
+# 后端在第一次翻译时才初始化，启动时不做任何网络或 SDK 加载工作
+
+class TranslationError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class TranslationBackend:
+    """翻译后端接口：translate() 批量翻译，返回与输入等长的
+    [{'translatedText': ..., 'detectedSourceLanguage': ...}]，未指定 source 时才有识别结果"""
+    name = 'base'
+
+    async def translate(self, texts, target, source=None):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+async def rest_error_message(resp):
+    """错误响应的说明：网关返回的 502/503 常是 HTML 或空内容，解析失败时退回状态说明"""
+    try:
+        data = await resp.json(content_type=None)
+        error = data.get('error') if isinstance(data, dict) else None
+        if isinstance(error, dict) and error.get('message'): return error['message']
+    except Exception:
+        pass
+    return resp.reason
+
+class GoogleRestBackend(TranslationBackend):
+    """直接调用 Cloud Translation v2 REST 接口，复用带 keep-alive 的 aiohttp 连接池，不占用线程"""
+    name = 'rest'
+    URL = 'https://translation.googleapis.com/language/translate/v2'
+
+    def __init__(self, api_key=None, credentials=None):
+        self.api_key = api_key
+        self.credentials = credentials
+        self._session = None
+        self._token_lock = asyncio.Lock()
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=TRANSLATE_CONCURRENCY * 2, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=TRANSLATE_TIMEOUT)
+            )
+        return self._session
+
+    async def _auth_headers(self):
+        if self.api_key: return {}
+        async with self._token_lock:
+            if not self.credentials.valid:
+                from google.auth.transport.requests import Request
+                await asyncio.get_running_loop().run_in_executor(None, self.credentials.refresh, Request())
+        return {'Authorization': f'Bearer {self.credentials.token}'}
+
+    async def translate(self, texts, target, source=None):
+        payload = {'q': texts, 'target': target, 'format': 'text'}
+        if source: payload['source'] = source
+        params = {'key': self.api_key} if self.api_key else None
+        headers = await self._auth_headers()
+        async with self._get_session().post(self.URL, json=payload, params=params, headers=headers) as resp:
+            if resp.status != 200:
+                raise TranslationError(resp.status, await rest_error_message(resp))
+            data = await resp.json(content_type=None)
+        return data['data']['translations']
+
+    async def close(self):
+        if self._session: await self._session.close()
+
+class GoogleSdkBackend(TranslationBackend):
+    """原 google-cloud-translate 同步客户端，在线程池中执行"""
+    name = 'sdk'
+
+    def __init__(self, credentials):
+        from google.cloud import translate_v2
+        self._client = translate_v2.Client(credentials=credentials)
+        # 独立线程池：请求卡住时只占用这里的线程，不会耗尽默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=TRANSLATE_CONCURRENCY, thread_name_prefix='translate')
 
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+    async def translate(self, texts, target, source=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(
+            self._client.translate, texts, target_language=target, source_language=source, format_='text'
+        ))
 
-# ==================== Google SDK 初始化 ====================
-json_key = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-if json_key:
+class StubBackend(TranslationBackend):
+    """确定性的本地替身引擎：不访问网络，译文为 '[目标语言] 原文'，可模拟延迟，用于离线测试和压测"""
+    name = 'stub'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.characters = 0
+
+    async def translate(self, texts, target, source=None):
+        self.requests += 1
+        self.characters += sum(len(t) for t in texts)
+        if self.latency: await asyncio.sleep(self.latency)
+        results = []
+        for text in texts:
+            item = {'translatedText': f"[{target}] {text}"}
+            if not source: item['detectedSourceLanguage'] = detect_language_local(text) or 'und'
+            results.append(item)
+        return results
+
+# ==================== 超时 / 重试 / 熔断 ====================
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断：熔断期间调用直接失败 (上层按原文透传，不再等待)；
+    冷却 reset_timeout 秒后放行一个探测请求，成功则恢复，失败则继续熔断"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        if self.state == 'closed': return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+        if self.state == 'half_open' and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != 'closed': logger.info('✅ 翻译后端已恢复，熔断关闭')
+        self.state = 'closed'
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open': logger.warning(f'⚠️ 翻译后端连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f}s')
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+translation_breaker = CircuitBreaker(TRANSLATE_BREAKER_THRESHOLD, TRANSLATE_BREAKER_RESET)
+metrics.gauge('translate_breaker_open', lambda: int(translation_breaker.state != 'closed'))
+
+def error_status(e):
+    """翻译服务返回的 HTTP 状态码 (TranslationError / aiohttp / google-api-core)，其他异常为 None"""
+    status = getattr(e, 'status', None) or getattr(e, 'code', None)
+    return status if isinstance(status, int) else None
+
+def is_transient_error(e):
+    """超时、连接错误、429 和 5xx 视为可重试"""
+    if isinstance(e, (asyncio.TimeoutError, aiohttp.ClientConnectionError, ConnectionError)): return True
+    status = error_status(e)
+    return status is not None and (status == 429 or status >= 500)
+
+def is_request_error(e):
+    """服务正常响应、只是这次请求本身有问题的 4xx (例如 400)；401/403 (鉴权、配额) 和 429 不算"""
+    status = error_status(e)
+    return status is not None and 400 <= status < 500 and status not in (401, 403, 429)
+
+async def call_translation_backend(backend, texts, target, source=None):
+    """带单次超时、抖动退避重试和熔断的后端调用"""
+    if not translation_breaker.allow():
+        raise CircuitOpenError('翻译后端熔断中，直接透传原文')
+    for attempt in range(TRANSLATE_RETRIES + 1):
+        try:
+            result = await asyncio.wait_for(backend.translate(texts, target, source=source), TRANSLATE_TIMEOUT)
+        except Exception as e:
+            if is_request_error(e):
+                # 后端有响应 (例如 400)，说明服务本身可用
+                translation_breaker.record_success()
+                raise
+            if not is_transient_error(e):
+                # 鉴权/配额错误、响应格式异常或后端代码错误：不重试，计为一次失败
+                translation_breaker.record_failure()
+                raise
+            if attempt == TRANSLATE_RETRIES:
+                translation_breaker.record_failure()
+                raise
+            # full jitter：在 [0, min(上限, 基数 * 2^n)] 之间随机等待
+            delay = random.uniform(0, min(TRANSLATE_BACKOFF_MAX, TRANSLATE_BACKOFF_BASE * 2 ** attempt))
+            logger.warning(f'⚠️ 翻译请求失败 ({type(e).__name__}: {e})，{delay:.2f}s 后第 {attempt + 1} 次重试')
+            await asyncio.sleep(delay)
+        else:
+            translation_breaker.record_success()
+            return result
+
+def load_google_credentials():
+    json_key = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+    if not json_key: return None
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_info(
+        json.loads(json_key), scopes=['https://www.googleapis.com/auth/cloud-translation']
+    )
+
+def create_translation_backend(kind):
+    if kind == 'stub': return StubBackend(STUB_TRANSLATE_LATENCY_MS / 1000)
+    credentials = load_google_credentials()
+    if kind == 'rest' and (GOOGLE_TRANSLATE_API_KEY or credentials):
+        return GoogleRestBackend(GOOGLE_TRANSLATE_API_KEY, credentials)
+    if credentials:
+        return GoogleSdkBackend(credentials)
+    logger.warning('⚠️ JSON Key 未设置')
+    return None
+
+_backend = None
+_backend_ready = False
+
+def get_translation_backend():
+    """首次调用时按 TRANSLATE_BACKEND 初始化；REST 初始化失败时退回 SDK"""
+    global _backend, _backend_ready
+    if _backend_ready: return _backend
+    _backend_ready = True
     try:
-        credentials = service_account.Credentials.from_service_account_info(json.loads(json_key))
-        client = translate.Client(credentials=credentials)
-        print('✅ Google Translate SDK 初始化成功')
+        _backend = create_translation_backend(TRANSLATE_BACKEND)
     except Exception as e:
-        print(f'❌ SDK 初始化失败: {e}')
-        client = None
-else:
-    print('⚠️ JSON Key 未设置')
-    client = None
+        logger.error(f'❌ 翻译后端 {TRANSLATE_BACKEND} 初始化失败: {e}')
+        if TRANSLATE_BACKEND == 'rest':
+            try: _backend = create_translation_backend('sdk')
+            except Exception as e: logger.error(f'❌ SDK 初始化失败: {e}')
+    if _backend: logger.info(f'✅ 翻译后端已初始化: {_backend.name}')
+    return _backend
+
+async def close_translation_backend():
+    if _backend: await _backend.close()
 
 # ==================== 状态存储与持久化 ====================
-webhook_cache = {} 
 
 global_config = {
     "channel_modes": {},      
     "bot_mappings": {},       
     "output_styles": {},
-    "processing_scopes": {}
+    "processing_scopes": {},
+    "target_languages": {},   # 频道 -> {目标语言: 发往的频道/子区 ID，None 为本频道}
+    "glossaries": {}          # 'global' 或频道 -> {术语: {目标语言: 固定译法}}
 }
 
+_config_loaded = False
+_config_save_handle = None  # 待执行的延迟写入
+_config_write_lock = threading.Lock()
+_config_dirty = set()       # 本进程修改过、尚未写入的频道，或全局术语 ('glossaries', 'global', 术语)
+_config_writes = 0          # 进行中的后台写入数
+_config_mtime = None        # 最近一次读入时配置文件的 mtime
+_config_watcher = None
+
+def read_config_file():
+    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+        return json.loads(f.read())
+
 def load_config():
-    """从持久化文件加载配置"""
-    global global_config
+    """从持久化文件加载配置：只在首次调用时读取并解析一次，之后 (例如断线重连) 直接跳过"""
+    global _config_loaded, _config_mtime
+    if _config_loaded: return
+    _config_loaded = True
     if DATA_DIR != '.' and not os.path.exists(DATA_DIR):
         try: os.makedirs(DATA_DIR, exist_ok=True)
         except: pass
 
-    if os.path.exists(CONFIG_FILE):
+    try:
+        _config_mtime = os.stat(CONFIG_FILE).st_mtime_ns
+        data = read_config_file()
+        for key in global_config.keys():
+            if key in data:
+                global_config[key] = data[key]
+        logger.info(f"📂 配置已加载")
+    except FileNotFoundError:
+        logger.info(f"📂 无配置文件，将在首次保存时创建")
+    except Exception as e:
+        logger.error(f"❌ 加载失败: {e}")
+
+def take_config_changes():
+    """在事件循环线程上取出待写入的改动 {配置项: {频道: 条目副本，已删除为 None}}，供后台线程合并写入。
+    频道级条目整体替换、不原地修改，复制两层即可。全局术语表各分片都能修改，按术语记为 {(范围, 术语): 译法}"""
+    changes = {key: {} for key in global_config}
+    for dirty in _config_dirty:
+        if isinstance(dirty, tuple):
+            key, scope, term = dirty
+            value = (global_config[key].get(scope) or {}).get(term)
+            changes[key][(scope, term)] = dict(value) if value is not None else None
+            continue
+        for key, section in global_config.items():
+            value = section.get(dirty)
+            changes[key][dirty] = dict(value) if isinstance(value, dict) else value
+    _config_dirty.clear()
+    return changes
+
+@contextmanager
+def config_file_lock():
+    """跨进程的配置文件锁，多个分片进程的写入依次进行"""
+    if fcntl is None:
+        yield
+        return
+    with open(CONFIG_FILE + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_config_file(changes):
+    """合并写入：在文件锁内读取磁盘上的最新配置，只覆盖本进程改动过的频道条目，全局术语只增删改动过的术语，
+    其他分片进程的修改不会被覆盖。原子写入：先写临时文件并 fsync，再 rename 覆盖"""
+    tmp_path = f"{CONFIG_FILE}.{os.getpid()}.tmp"
+    with _config_write_lock, config_file_lock():
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for key in global_config.keys():
-                    if key in data:
-                        global_config[key] = data[key]
-            print(f"📂 配置已加载")
+            try:
+                data = read_config_file()
+            except FileNotFoundError:
+                data = {}
+            for key, entries in changes.items():
+                section = data.setdefault(key, {})
+                for cid, value in entries.items():
+                    if isinstance(cid, tuple):
+                        scope, term = cid
+                        terms = section.setdefault(scope, {})
+                        if value is None: terms.pop(term, None)
+                        else: terms[term] = value
+                        if not terms: del section[scope]
+                    elif value is None: section.pop(cid, None)
+                    else: section[cid] = value
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, CONFIG_FILE)
+            logger.debug("💾 配置已落盘")
         except Exception as e:
-            print(f"❌ 加载失败: {e}")
-    else:
-        print(f"📂 无配置文件，将在首次保存时创建")
+            logger.error(f"❌ 保存失败: {e}")
 
-def save_config():
-    """保存配置"""
+def save_config(cid):
+    """保存某个频道 (或某个全局术语) 的配置改动：CONFIG_SAVE_DELAY 秒内的多次修改合并为一次写入，
+    写入在线程池中执行，不阻塞事件循环"""
+    global _config_save_handle
+    _config_dirty.add(cid)
     try:
-        with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(global_config, f, ensure_ascii=False, indent=4)
-        if DEBUG: print("💾 配置已落盘")
-    except Exception as e:
-        print(f"❌ 保存失败: {e}")
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        write_config_file(take_config_changes())
+        return
+    if _config_save_handle is None:
+        _config_save_handle = loop.call_later(CONFIG_SAVE_DELAY, _write_config_in_background)
+
+def _write_config_in_background():
+    global _config_save_handle, _config_writes
+    _config_save_handle = None
+    _config_writes += 1
+    fut = asyncio.get_running_loop().run_in_executor(None, write_config_file, take_config_changes())
+    fut.add_done_callback(_config_write_done)
+
+def _config_write_done(fut):
+    global _config_writes
+    _config_writes -= 1
+
+def flush_config():
+    """退出前调用：立即写入尚未落盘的修改"""
+    global _config_save_handle
+    if _config_save_handle is None: return
+    _config_save_handle.cancel()
+    _config_save_handle = None
+    write_config_file(take_config_changes())
+
+async def watch_config():
+    """分片模式：定期检查配置文件的 mtime，其他进程写入后重新加载，并重建路由索引和术语表自动机。
+    本进程有未落盘的修改时先不读取，等合并写入之后再同步"""
+    global _config_mtime
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(CONFIG_SYNC_INTERVAL)
+        if _config_save_handle or _config_writes: continue
+        try:
+            mtime = os.stat(CONFIG_FILE).st_mtime_ns
+            if mtime == _config_mtime: continue
+            data = await loop.run_in_executor(None, read_config_file)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error(f"❌ 配置同步失败: {e}")
+            continue
+        if _config_save_handle or _config_writes: continue  # 读取期间又有了本地修改
+        _config_mtime = mtime
+        for key in global_config:
+            global_config[key] = data.get(key, {})
+        rebuild_routing_index()
+        glossary.invalidate('global')
+        logger.debug("🔄 配置已与磁盘同步")
+
+# ==================== 路由索引 ====================
+# 由 global_config 预先计算：频道是否需要处理、模式/样式/范围/监听目标，on_message 中 O(1) 查询，
+# 未开启翻译的频道不产生任何网络请求。配置变更时只重建对应频道的条目。
+routing_index = {}       # int 频道 ID -> 路由 (只包含开启翻译或有监听设定的频道)
+own_webhook_ids = set()  # 本机器人发送用的 webhook ID，回显消息直接丢弃
+
+def build_route(cid):
+    mode = global_config["channel_modes"].get(cid, 'off')
+    mappings = global_config["bot_mappings"].get(cid) or {}
+    if mode == 'off' and not mappings: return None
+    return {
+        'mode': mode,
+        'style': global_config["output_styles"].get(cid, 'auto'),
+        'scope': global_config["processing_scopes"].get(cid, 'translate_only'),
+        'mappings': mappings,
+        'targets': {lang: (int(dest) if dest else None)
+                    for lang, dest in (global_config["target_languages"].get(cid) or {DEFAULT_TARGET_LANGUAGE: None}).items()}
+    }
+
+def refresh_route(cid):
+    route = build_route(cid)
+    if route: routing_index[int(cid)] = route
+    else: routing_index.pop(int(cid), None)
+
+def rebuild_routing_index():
+    routing_index.clear()
+    for section in ("channel_modes", "bot_mappings"):
+        for cid in global_config[section]:
+            refresh_route(cid)
+    logger.debug(f"🧭 路由索引已重建: {len(routing_index)} 个频道")
+
+def config_changed(cid):
+    """Slash 命令修改某频道配置后调用：落盘并增量更新路由索引"""
+    save_config(cid)
+    refresh_route(cid)
+
+# ==================== 翻译缓存 ====================
+
+class SharedCacheStore:
+    """多个分片进程共享的翻译缓存层 (SQLite WAL)。读在事件循环线程上用独立连接直接查 (主键查询，很快)，
+    写入批量放到线程池，WAL 下读写互不阻塞。每写入 prune_every 批清理一次过期行，并按到期时间淘汰超出 max_rows 的行"""
+
+    def __init__(self, path, max_rows, prune_every=50):
+        self.path = path
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._reader = None
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._batches = 0
+
+    def open(self):
+        if self._reader: return
+        try:
+            self._writer = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            self._writer.execute('PRAGMA journal_mode=WAL')
+            with self._write_lock, self._writer:
+                self._writer.execute('CREATE TABLE IF NOT EXISTS cache (text TEXT, target TEXT, expires_at REAL, result TEXT, '
+                                     'PRIMARY KEY (text, target))')
+                self._writer.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)')
+                self._prune()
+            self._reader = sqlite3.connect(self.path, timeout=0.1, check_same_thread=False)
+            logger.info(f"📂 共享翻译缓存已打开: {self.path}")
+        except Exception as e:
+            logger.error(f"❌ 共享翻译缓存打开失败，仅使用进程内缓存: {e}")
+            self._reader = self._writer = None
+
+    def get(self, key):
+        """返回 (expires_at, result) 或 None"""
+        if not self._reader: return None
+        try:
+            row = self._reader.execute('SELECT expires_at, result FROM cache WHERE text = ? AND target = ?', key).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or row[0] < time.time(): return None
+        return row
+
+    def put_many(self, rows):
+        if not self._writer: return
+        try:
+            with self._write_lock, self._writer:
+                self._writer.executemany('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', rows)
+                self._batches += 1
+                if self._batches % self.prune_every == 0: self._prune()
+        except Exception as e:
+            logger.error(f"❌ 共享翻译缓存写入失败: {e}")
+
+    def _prune(self):
+        """在写连接的事务内调用：删除过期行，超出上限时先淘汰最早到期的 (即最早写入的)"""
+        self._writer.execute('DELETE FROM cache WHERE expires_at < ?', (time.time(),))
+        excess = self._writer.execute('SELECT COUNT(*) FROM cache').fetchone()[0] - self.max_rows
+        if excess > 0:
+            self._writer.execute('DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY expires_at LIMIT ?)', (excess,))
+
+    def close(self):
+        for conn in (self._reader, self._writer):
+            if conn: conn.close()
+        self._reader = self._writer = None
+
+class TranslationCache:
+    """线程安全的 LRU 翻译缓存：按条数和 TTL 淘汰，可选落盘以便重启后继续命中；
+    可挂一个多进程共享层 (shared)，进程内未命中时再查共享层"""
+
+    def __init__(self, max_size, ttl, path=None, flush_every=100, shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.flush_every = flush_every
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # (text, target) -> (expires_at, result)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = 0
+        self._flush_scheduled = False
+        self._shared_pending = []   # 待批量写入共享层的行
+
+    def _insert(self, key, entry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None: del self._data[key]
+        entry = self.shared.get(key) if self.shared else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._insert(key, entry)
+            self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        entry = (time.time() + self.ttl, value)
+        with self._lock:
+            self._insert(key, entry)
+            self._dirty += 1
+            should_flush = self.path and self._dirty >= self.flush_every
+        if should_flush: self._schedule_flush()
+        if self.shared:
+            # 同一轮事件循环里的多次写入 (一个批次的译文) 合并成一次共享层写入
+            self._shared_pending.append((key[0], key[1], entry[0], value))
+            if len(self._shared_pending) == 1:
+                asyncio.get_running_loop().call_soon(self._flush_shared)
+
+    def _schedule_flush(self):
+        """put 在事件循环上调用：落盘 (序列化全部条目 + 写文件) 放到线程池执行，同一时间只安排一次"""
+        if self._flush_scheduled: return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_scheduled = True
+        loop.run_in_executor(None, self._flush_in_background)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            self._flush_scheduled = False
+
+    def _flush_shared(self):
+        rows, self._shared_pending = self._shared_pending, []
+        if rows: asyncio.get_running_loop().run_in_executor(None, self.shared.put_many, rows)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"缓存 {len(self._data)}/{self.max_size} 条 | 命中 {self.hits} | 未命中 {self.misses} | 命中率 {rate:.1f}%"
+
+    def load(self):
+        """从磁盘恢复未过期的条目"""
+        if self.shared: self.shared.open()
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+            now = time.time()
+            with self._lock:
+                for text, target, expires_at, result in rows[-self.max_size:]:
+                    if expires_at > now:
+                        self._data[(text, target)] = (expires_at, result)
+            logger.info(f"📂 翻译缓存已加载: {len(self._data)} 条")
+        except Exception as e:
+            logger.error(f"❌ 翻译缓存加载失败: {e}")
+
+    def close(self):
+        """退出前调用：写完共享层的待写入行并关闭"""
+        if not self.shared: return
+        rows, self._shared_pending = self._shared_pending, []
+        if rows: self.shared.put_many(rows)
+        self.shared.close()
+
+    def flush(self):
+        """原子写入 (临时文件 + rename)，避免写一半时崩溃损坏缓存文件"""
+        if not self.path: return
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty: return
+                items = list(self._data.items())  # 持锁只做浅复制，序列化在锁外进行
+                self._dirty = 0
+            rows = [[k[0], k[1], exp, v] for k, (exp, v) in items]
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(rows, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"❌ 翻译缓存落盘失败: {e}")
+
+translation_cache = TranslationCache(
+    TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL,
+    path=TRANSLATION_CACHE_FILE if TRANSLATION_CACHE_PERSIST and not TRANSLATION_CACHE_SHARED else None,
+    shared=SharedCacheStore(TRANSLATION_CACHE_DB, TRANSLATION_CACHE_SHARED_SIZE) if TRANSLATION_CACHE_SHARED else None
+)
+metrics.gauge('translation_cache_entries', lambda: len(translation_cache))
 
 # ==================== 核心功能函数 ====================
 
-def log(message):
-    if DEBUG:
-        print(message)
+# ==================== 文本预处理 ====================
+# 一次扫描完成：去除 Markdown 链接/裸 URL，并把提及、自定义表情、代码、时间戳等不应翻译的片段
+# 换成占位符、按顺序记录原文，翻译后一次替换还原。残留括号和 📷 只在文本中确实存在时才做额外处理。
+TOKEN_RE = re.compile(r"""
+    (?=[\[hw`<@$])                                      # 先按首字符快速排除不可能匹配的位置
+    (?:
+    (?P<mdlink>\[(?P<label>[^\]]*)\]\(https?://\S+\))   # [text](url) -> text
+  | (?P<url>https?://\S+|www\.\S+)                       # 裸 URL -> 删除
+  | (?P<keep>                                            # 不翻译的片段 -> 占位符
+        ```.*?```                                        # 代码块
+      | `[^`\n]+`                                        # 行内代码
+      | <@!?&?\d+>                                       # 用户/角色提及
+      | @everyone | @here
+      | <\#\d+>                                          # 频道
+      | <a?:\w+:\d+>                                     # 自定义表情
+      | <t:-?\d+(?::[tTdDfFR])?>                          # 时间戳
+      | \$[A-Za-z]{1,6}(?:\.[A-Za-z]{1,2})?\b              # 股票代码 $AAPL / $BRK.B
+    )
+    )
+""", re.X | re.S)
+PLACEHOLDER_RE = re.compile(r'@@PROTECTED_(\d+)@@')
+BRACKET_RESIDUE_RE = re.compile(r'\[\s*\]\(\s*\)')
+EMPTY_BRACKET_RE = re.compile(r'\[\s*\]')
+
+def preprocess_text(text):
+    """返回 (清洗并保护后的文本, 被保护片段列表)，占位符 @@PROTECTED_i@@ 对应列表第 i 项"""
+    if not text: return "", []
+    tokens = []
+
+    def replace(match):
+        kind = match.lastgroup
+        if kind == 'keep':
+            tokens.append(match.group(0))
+            return f"@@PROTECTED_{len(tokens) - 1}@@"
+        if kind == 'mdlink':
+            # 链接文字本身也可能包含提及/URL
+            return TOKEN_RE.sub(replace, match.group('label'))
+        return ""
+
+    text = TOKEN_RE.sub(replace, text)
+    # 残留的括号和方括号组合 (与原 clean_text 的清理顺序一致)
+    if '[' in text:
+        text = text.replace('[](', '').replace('[]', '')
+        text = BRACKET_RESIDUE_RE.sub('', text)
+        text = EMPTY_BRACKET_RE.sub('', text)
+    # 去除特定 Emoji
+    if '📷' in text:
+        text = text.replace('📷', '')
+    return text.strip(), tokens
+
+def restore_tokens(text, tokens, target=None):
+    """占位符还原为原文；术语表片段 (原文, {目标语言: 固定译法}) 按 target 换成固定译法"""
+    if not tokens: return text
+
+    def restore(match):
+        index = int(match.group(1))
+        if index >= len(tokens): return match.group(0)
+        token = tokens[index]
+        if isinstance(token, tuple):
+            fixed = glossary_translation(token[1], target) if target else None
+            return token[0] if fixed is None else fixed
+        return token
+
+    return PLACEHOLDER_RE.sub(restore, text)
 
 def clean_text(text):
-    if not text: return ""
-    # 1. 【优先】去除 Markdown 格式的链接 [text](url) -> 保留 text
-    text = re.sub(r'\[([^\]]*)\]\(https?://\S+\)', r'\1', text) 
-    # 2. 去除所有裸 URL 
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
-    # 3. 强力清理残留的括号和方括号组合
-    text = text.replace('[](', '').replace('[]', '')
-    text = re.sub(r'\[\s*\]\(\s*\)', '', text) 
-    text = re.sub(r'\[\s*\]', '', text)        
-    # 4. 去除特定 Emoji
-    text = text.replace('📷', '')
-    return text.strip()
-
-def translate_text_sync(text):
-    text = clean_text(text)
-    if not text: return ""
-    
+    """去除链接/URL 后的纯文本 (不替换占位符)"""
+    return restore_tokens(*preprocess_text(text))
+
+# ==================== 术语表 ====================
+# 全局和频道术语表 (股票代码、产品名、固定译法) 存在 global_config["glossaries"]：
+# {'global' 或频道 ID: {术语: {目标语言: 固定译法}}}，空 dict 表示原样保留不翻译。
+# 每个频道 (全局 + 本频道术语) 编译一个 Aho-Corasick 自动机，一次扫描找出所有术语，换成与提及相同的占位符。
+
+def is_word_char(ch):
+    return ch.isascii() and (ch.isalnum() or ch == '_')
+
+def fold_case(text):
+    """逐字符小写；小写后长度会变的字符 (例如 'İ') 保留原字符，下标与原文保持一致"""
+    lowered = text.lower()
+    if len(lowered) == len(text): return lowered
+    return ''.join(low if len(low) == 1 else ch for ch, low in ((ch, ch.lower()) for ch in text))
+
+def normalize_language_code(code):
+    """'zh-cn' -> 'zh-CN'，'zh-hant' -> 'zh-Hant'"""
+    primary, _, region = code.partition('-')
+    if not region: return primary.lower()
+    return f"{primary.lower()}-{region.upper() if len(region) == 2 else region.title()}"
+
+def glossary_translation(translations, target):
+    """按目标语言取固定译法 (不区分大小写)；没有完全匹配时，只写了主语言的译法 (例如 'zh') 也适用于 'zh-CN'"""
+    target = target.lower()
+    fallback = None
+    for language, text in translations.items():
+        if language.lower() == target: return text
+        if fallback is None and '-' not in language and same_language(language, target): fallback = text
+    return fallback
+
+class GlossaryMatcher:
+    """Aho-Corasick 多模式匹配：不区分大小写，英文术语要求单词边界，重叠时取最左最长"""
+
+    def __init__(self, terms):
+        self.terms = {fold_case(term): translations for term, translations in terms.items() if term}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]  # 状态 -> 在此结束的术语长度
+        for term in self.terms:
+            self._add(term)
+        self._link()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _add(self, term):
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = self._goto[state][ch] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = (len(term),)
+
+    def _link(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def find(self, text):
+        """返回不重叠的 (起点, 终点) 列表"""
+        lowered = fold_case(text)
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        found = []
+        for i, ch in enumerate(lowered):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length in out[state]:
+                start, end = i + 1 - length, i + 1
+                if is_word_char(text[start]) and start > 0 and is_word_char(text[start - 1]): continue
+                if is_word_char(text[i]) and end < len(text) and is_word_char(text[end]): continue
+                found.append((start, end))
+        if not found: return found
+        found.sort(key=lambda m: (m[0], -m[1]))
+        matches, last_end = [], 0
+        for start, end in found:
+            if start >= last_end:
+                matches.append((start, end))
+                last_end = end
+        return matches
+
+    def protect(self, text, tokens):
+        """把术语换成占位符，记为 (原文, 固定译法)，与提及等片段共用 tokens 列表"""
+        matches = self.find(text)
+        if not matches: return text
+        pieces, last = [], 0
+        for start, end in matches:
+            term = text[start:end]
+            tokens.append((term, self.terms.get(fold_case(term), {})))
+            pieces.append(text[last:start])
+            pieces.append(f"@@PROTECTED_{len(tokens) - 1}@@")
+            last = end
+        pieces.append(text[last:])
+        return ''.join(pieces)
+
+class Glossary:
+    """按频道缓存编译好的自动机。没有频道术语的频道共用全局自动机；
+    术语变化时只让受影响的自动机失效，下次用到时再编译"""
+
+    def __init__(self):
+        self._matchers = {}  # 'global' 或频道 ID 字符串 -> GlossaryMatcher / None
+
+    def matcher(self, channel=None):
+        glossaries = global_config["glossaries"]
+        key = str(channel) if channel is not None and str(channel) in glossaries else 'global'
+        if key in self._matchers: return self._matchers[key]
+        terms = dict(glossaries.get('global') or {})
+        if key != 'global': terms.update(glossaries[key])
+        matcher = self._matchers[key] = GlossaryMatcher(terms) if terms else None
+        logger.debug(f"📖 术语表已编译: {key} ({len(terms)} 条)")
+        return matcher
+
+    def invalidate(self, scope):
+        if scope == 'global': self._matchers.clear()
+        else: self._matchers.pop(scope, None)
+
+glossary = Glossary()
+
+def glossary_changed(scope, term):
+    """术语表修改后调用：落盘并让对应的自动机失效。全局术语按术语记录改动，多个分片同时修改时在写入时合并"""
+    save_config(('glossaries', scope, term) if scope == 'global' else scope)
+    glossary.invalidate(scope)
+
+# ==================== 本地语言判定 ====================
+# 在本地用文字脚本 + 常用词 + 字符二元组做快速判定，省掉 detect_language 这一次网络往返。
+# 返回 'zh' (已是中文) / 'en' (明确是英文) / 'skip' (没有可翻译的文字) / None (不确定，交给 API 自动识别)
+
+CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+EN_STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before but by can could did do does for from had has
+have he her his how i if in into is it its just more most new no not now of on one only or our out over
+said says she so than that the their them then there these they this to up us was we were what when which
+who will with would you your
+""".split())
+
+# 其他常见拉丁语系语言的高频词，命中多于英文时交给 API 判断
+OTHER_STOPWORDS = frozenset("""
+el la los las del que por para con una uno es en y le les des du et est une pour dans pas qui au aux
+der die das und ist nicht mit den dem ein eine zu auf il che di non per sono della gli o não com uma os
+""".split())
+
+EN_BIGRAMS = frozenset("""
+th he in er an re on at en nd ti es or te of ed is it al ar st to nt ng se ha as ou io le ve co me de hi
+ri ro ic ne ea ra ce li ch ll be ma si om ur
+""".split())
+
+def detect_language_local(text):
+    letters = cjk = kana = ascii_letters = 0
+    for ch in text:
+        if ch.isalpha():
+            letters += 1
+            if 'a' <= ch <= 'z' or 'A' <= ch <= 'Z': ascii_letters += 1
+            elif '\u4e00' <= ch <= '\u9fff': cjk += 1
+            elif '\u3040' <= ch <= '\u30ff': kana += 1
+    if not letters: return 'skip'
+    if kana: return None  # 汉字夹杂假名是日文，交给 API 识别
+    if cjk: return 'zh'
+    # 西里尔、假名、韩文、带变音符的拉丁字母等占比较高 -> 不确定
+    if ascii_letters / letters < 0.97: return None
+
+    words = [w.lower() for w in WORD_RE.findall(text)]
+    if not words: return 'skip'
+    en_hits = sum(1 for w in words if w in EN_STOPWORDS)
+    other_hits = sum(1 for w in words if w in OTHER_STOPWORDS)
+    if other_hits > en_hits: return None
+    if en_hits / len(words) >= 0.15: return 'en'
+
+    bigrams = matched = 0
+    for w in words:
+        for i in range(len(w) - 1):
+            bigrams += 1
+            if w[i:i + 2] in EN_BIGRAMS: matched += 1
+    if bigrams >= 8 and matched / bigrams >= 0.45: return 'en'
+    return None
+
+def prepare_segment(text, channel=None):
+    """清洗、本地判定并保护提及、术语等片段 (与目标语言无关，每条消息只做一次)。
+    不需要翻译的 (空/过短/没有文字/全是受保护片段) 会填好 result (保留占位符，还原时按目标语言替换固定译法)，
+    其余按目标语言交给 lookup_segment"""
+    with metrics.timer('clean', channel):
+        protected, tokens = preprocess_text(text)
+        matcher = glossary.matcher(channel)
+        if matcher and protected: protected = matcher.protect(protected, tokens)
+    segment = {'text': protected, 'tokens': tokens, 'language': None, 'result': None, 'channel': channel}
+    if not protected:
+        segment['result'] = ""
+        return segment
+    # 只剩占位符 (提及、股票代码、术语等)：不需要调用 API
+    if tokens and not any(ch.isalpha() for ch in PLACEHOLDER_RE.sub('', protected)):
+        metrics.inc('protected_only', channel=channel)
+        segment['result'] = protected
+        return segment
+    clean = restore_tokens(protected, tokens)
+
     # ------------------ 修改区域 ------------------
     # 修改要求：英文少于15个字母的内容不要翻译
-    if len(text) < 15: return text
+    if len(clean) < 15:
+        segment['result'] = protected
+        return segment
     # ---------------------------------------------
 
-    if re.search(r'[\u4e00-\u9fff]', text): return text
-    
-    mention_placeholders = {}
-    counter = 0
-    for mention in ['@everyone', '@here']:
-        placeholder = f"@@PROTECTED_MENTION_{counter}@@"
-        text = text.replace(mention, placeholder)
-        mention_placeholders[placeholder] = mention
-        counter += 1
-
-    def protect_mention(match):
-        nonlocal counter
-        placeholder = f"@@PROTECTED_MENTION_{counter}@@"
-        mention_placeholders[placeholder] = match.group(0)
-        counter += 1
-        return placeholder
-
-    text = re.sub(r'<@!?&?\d+>', protect_mention, text)
+    with metrics.timer('detect', channel):
+        language = detect_language_local(clean)
+    if language == 'skip':
+        segment['result'] = protected
+        return segment
+    segment['language'] = language
+    return segment
 
-    try:
-        if not client: return text
-        detection = client.detect_language(text)
-        if detection['language'].startswith('zh'): return text
-        result = client.translate(
-            text, source_language='en', target_language='zh-CN', format_='text'
-        )['translatedText']
-        
-        result = result.replace(' \n', '\n').replace('\n ', '\n')
-        orig_double_newlines = text.count('\n\n')
-        trans_double_newlines = result.count('\n\n')
-        if trans_double_newlines > orig_double_newlines:
-             result = re.sub(r'\n+', '\n', result)
-        
-    except Exception as e:
-        print(f'❌ 翻译异常: {e}')
-        return text
+def same_language(a, b):
+    """'zh' / 'zh-CN' / 'zh-TW' 视为同一语言，只比较主语言代码"""
+    return a.split('-')[0].lower() == b.split('-')[0].lower()
 
-    for placeholder, original in mention_placeholders.items():
-        result = result.replace(placeholder, original)
+def lookup_segment(segment, target, channel=None):
+    """某个目标语言下能否在本地得出结果：源语言就是目标语言则原样保留，否则查缓存；None 表示需要调用 API"""
+    if segment['result'] is not None: return segment['result']
+    if segment['language'] and same_language(segment['language'], target): return segment['text']
+    # 缓存键：清洗并保护提及后的文本 + 目标语言
+    result = translation_cache.get((segment['text'], target))
+    metrics.inc('cache_misses' if result is None else 'cache_hits', channel=channel)
+    return result
+
+NEWLINE_SPACE_RE = re.compile(r' ?\n ?')
+MULTI_NEWLINE_RE = re.compile(r'\n+')
 
+def finalize_translation(text, response, target=DEFAULT_TARGET_LANGUAGE):
+    """处理单条 API 响应：识别出的源语言就是目标语言则保留原文，否则修正换行"""
+    if same_language(response.get('detectedSourceLanguage') or 'und', target): return text
+    result = response['translatedText']
+    result = NEWLINE_SPACE_RE.sub('\n', result)
+    orig_double_newlines = text.count('\n\n')
+    trans_double_newlines = result.count('\n\n')
+    if trans_double_newlines > orig_double_newlines:
+         result = MULTI_NEWLINE_RE.sub('\n', result)
     return result
 
-async def async_translate_text(text):
+async def translate_segments(segments, target=DEFAULT_TARGET_LANGUAGE):
+    """一次 API 请求把多个已预处理的片段译为 target (按英文/自动识别分组)，返回保护状态下的译文，顺序与输入一致"""
+    results = [None] * len(segments)
+    backend = get_translation_backend()
+
+    # 本地判定为英文的指定源语言；其余 (不确定、中文译为其他语言) 让翻译接口自动识别，并从同一次响应里读取识别结果
+    for language in ('en', None):
+        group = [i for i, seg in enumerate(segments) if (seg['language'] == 'en') == (language == 'en')]
+        if not group: continue
+        texts = [segments[i]['text'] for i in group]
+        try:
+            if not backend: raise RuntimeError('翻译后端未初始化')
+            with metrics.timer('translate'):
+                responses = await call_translation_backend(backend, texts, target, source=language)
+            metrics.inc('api_requests')
+            # 成功发出后才计入字符数 (失败、超时、熔断不计费)，按片段来源频道归属
+            for i in group: metrics.inc('api_characters', len(segments[i]['text']), channel=segments[i]['channel'])
+        except Exception as e:
+            logger.error(f'❌ 翻译异常: {type(e).__name__} {e}')
+            metrics.inc('translate_errors')
+            for i in group: results[i] = segments[i]['text']
+            continue
+        for i, text, response in zip(group, texts, responses):
+            results[i] = finalize_translation(text, response, target)
+            translation_cache.put((text, target), results[i])
+
+    return results
+
+def chunk_segments(segments):
+    """按单次请求的段数和字符数上限切分"""
+    chunks, chunk, chars = [], [], 0
+    for seg in segments:
+        if chunk and (len(chunk) >= TRANSLATE_BATCH_SIZE or chars + len(seg['text']) > TRANSLATE_BATCH_CHARS):
+            chunks.append(chunk)
+            chunk, chars = [], 0
+        chunk.append(seg)
+        chars += len(seg['text'])
+    if chunk: chunks.append(chunk)
+    return chunks
+
+translate_semaphore = asyncio.Semaphore(TRANSLATE_CONCURRENCY)
+
+async def translate_unique_segments(segments, target=DEFAULT_TARGET_LANGUAGE):
+    """翻译一组互不相同的片段；超过单次请求上限时拆成多个批次有界并发执行"""
+    async def run_chunk(chunk):
+        async with translate_semaphore:
+            return await translate_segments(chunk, target)
+
+    chunks = chunk_segments(segments)
+    results = await asyncio.gather(*(run_chunk(c) for c in chunks))
+    return [result for chunk_results in results for result in chunk_results]
+
+class TranslationScheduler:
+    """跨消息微批调度：在很短的窗口内收集所有并发消息的片段，合并成少量批量请求。
+    相同片段 (保护后文本 + 判定语言 + 目标语言) 在途时只翻译一次，所有调用方共享同一个 Future；
+    同一批里的不同目标语言各发一个请求，并发执行"""
+
+    def __init__(self, window):
+        self.window = window
+        self._pending = {}   # 尚未发出的 (文本, 语言, 目标语言) -> (片段, Future)
+        self._inflight = {}  # 已发出、等待结果的 (文本, 语言, 目标语言) -> (片段, Future)
+        self._timer = None
+        self._active_batches = 0
+        self._tasks = set()
+
+    def submit(self, segment, target=DEFAULT_TARGET_LANGUAGE):
+        key = (segment['text'], segment['language'], target)
+        entry = self._inflight.get(key) or self._pending.get(key)
+        if entry: return entry[1]
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending[key] = (segment, fut)
+        if len(self._pending) >= TRANSLATE_BATCH_SIZE:
+            self._flush()
+        elif self._timer is None:
+            # 空闲时不等窗口，只让出一轮事件循环以合并同一条消息的片段；有批次在途时才等窗口攒批
+            delay = self.window if self._active_batches else 0
+            self._timer = loop.call_later(delay, self._flush)
+        return fut
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending: return
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        self._active_batches += 1
+        try:
+            groups = {}
+            for (_, _, target), entry in batch.items():
+                groups.setdefault(target, []).append(entry)
+            await asyncio.gather(*(self._run_target(target, entries) for target, entries in groups.items()))
+        finally:
+            for key in batch: self._inflight.pop(key, None)
+            self._active_batches -= 1
+
+    async def _run_target(self, target, entries):
+        try:
+            results = await translate_unique_segments([segment for segment, _ in entries], target)
+            for (_, fut), result in zip(entries, results):
+                if not fut.done(): fut.set_result(result)
+        except Exception as e:
+            logger.error(f'❌ 批量翻译异常: {e}')
+            for segment, fut in entries:
+                if not fut.done(): fut.set_result(segment['text'])
+
+translation_scheduler = TranslationScheduler(TRANSLATE_BATCH_WINDOW_MS / 1000)
+
+async def async_translate_multi(texts, targets, channel=None):
+    """译为多个目标语言：预处理和语言判定每个片段只做一次，之后按目标语言查缓存，
+    只把需要调用 API 的 (片段, 目标语言) 提交给微批调度器，所有目标语言并发翻译。返回 {目标语言: 译文列表}"""
+    unique = list(dict.fromkeys(t for t in texts if t))
+    if not unique: return {target: ["" for _ in texts] for target in targets}
+    segments = [prepare_segment(t, channel) for t in unique]
+    results = {target: [lookup_segment(seg, target, channel) for seg in segments] for target in targets}
+    pending = [(target, i) for target in targets for i, result in enumerate(results[target]) if result is None]
+    if pending:
+        # shield：某个调用方被取消时不影响共享同一 Future 的其他调用方
+        done = await asyncio.gather(*(asyncio.shield(translation_scheduler.submit(segments[i], target)) for target, i in pending))
+        for (target, i), result in zip(pending, done):
+            results[target][i] = result
+    output = {}
+    for target in targets:
+        translated = {t: restore_tokens(result, seg['tokens'], target) for t, seg, result in zip(unique, segments, results[target])}
+        output[target] = [translated[t] if t else "" for t in texts]
+    return output
+
+async def async_translate_batch(texts, channel=None, target=DEFAULT_TARGET_LANGUAGE):
+    return (await async_translate_multi(texts, (target,), channel))[target]
+
+async def async_translate_text(text, channel=None, target=DEFAULT_TARGET_LANGUAGE):
     if not text: return ""
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, functools.partial(translate_text_sync, text))
+    return (await async_translate_batch([text], channel, target))[0]
+
+PARAGRAPH_SPLIT_RE = re.compile(r'(\n\s*\n)')
+
+async def translate_changed(texts, previous, channel=None, target=DEFAULT_TARGET_LANGUAGE):
+    """编辑同步用：对照上次的 (原文, 译文)，未变的片段和段落沿用旧译文，只翻译变化的段落"""
+    known = {}
+    for source, translated in previous:
+        known[source] = translated
+        # 段落数一致时按段落对齐，单独复用每一段
+        src_paras, dst_paras = PARAGRAPH_SPLIT_RE.split(source)[::2], PARAGRAPH_SPLIT_RE.split(translated)[::2]
+        if len(src_paras) > 1 and len(src_paras) == len(dst_paras):
+            known.update(zip(src_paras, dst_paras))
+    pieces = [[text] if text in known else PARAGRAPH_SPLIT_RE.split(text) for text in texts]
+    paragraphs = [p for chunks in pieces for p in chunks[::2] if p]
+    missing = list(dict.fromkeys(p for p in paragraphs if p not in known))
+    metrics.inc('edit_segments_reused', len(paragraphs) - len(missing), channel=channel)
+    metrics.inc('edit_segments_translated', len(missing), channel=channel)
+    if missing:
+        known.update(zip(missing, await async_translate_batch(missing, channel, target)))
+    return [''.join(known.get(p, p) if i % 2 == 0 else p for i, p in enumerate(chunks)) for chunks in pieces]
+
+class PartsRecord:
+    """__slots__ 记录：每条转发消息都会生成一份 parts，比 dict 省内存；
+    仍支持 obj['key'] 读写，(容器, 键) 槽位和按键访问的写法不变"""
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__: setattr(self, name, values.get(name))
+
+    def __getitem__(self, key): return getattr(self, key)
+    def __setitem__(self, key, value): setattr(self, key, value)
 
-async def process_message_content(message):
-    """提取和翻译消息"""
-    parts = {'content': message.content or "", 'embeds': [], 'image_urls': []}
-    original_raw_content = message.content or ""
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+class MessageParts(PartsRecord):
+    __slots__ = ('content', 'embeds', 'image_urls', 'segments')
+
+class EmbedParts(PartsRecord):
+    __slots__ = ('title', 'description', 'color', 'url', 'timestamp', 'author', 'footer', 'image', 'thumbnail', 'fields')
+
+class EmbedAuthor(PartsRecord):
+    __slots__ = ('name', 'icon_url')
+
+class EmbedFooter(PartsRecord):
+    __slots__ = ('text', 'icon_url')
+
+class FieldParts(PartsRecord):
+    __slots__ = ('name', 'value', 'inline')
+
+def extract_message_parts(message):
+    """把消息拆成 parts 和待翻译的槽位 (容器, 键)，不做翻译"""
+    parts = MessageParts(content=message.content or "", embeds=[], image_urls=[], segments=[])
+    slots = []  # (容器, 键)，翻译结果按顺序写回
 
     if parts['content']:
-        parts['content'] = await async_translate_text(parts['content'])
+        slots.append((parts, 'content'))
 
     if message.attachments:
-        print(f"[IMG_DEBUG] 📥 发现 {len(message.attachments)} 个附件")
+        logger.debug(f"[IMG_DEBUG] 📥 发现 {len(message.attachments)} 个附件")
         for attachment in message.attachments:
             parts['image_urls'].append(attachment.url)
 
@@ -169,34 +1388,36 @@ async def process_message_content(message):
             should_rebuild_embed = True
         
         # 日志
-        if embed.image: print(f"[IMG_DEBUG] 📥 Embed[{i}] Image: {embed.image.url}")
-        if embed.thumbnail: print(f"[IMG_DEBUG] 📥 Embed[{i}] Thumbnail: {embed.thumbnail.url}")
+        if embed.image: logger.debug(f"[IMG_DEBUG] 📥 Embed[{i}] Image: {embed.image.url}")
+        if embed.thumbnail: logger.debug(f"[IMG_DEBUG] 📥 Embed[{i}] Thumbnail: {embed.thumbnail.url}")
 
         if should_rebuild_embed:
-            embed_data = {
-                'title': await async_translate_text(embed.title) if embed.title else "",
-                'description': await async_translate_text(embed.description) if embed.description else "",
-                'color': embed.color.value if embed.color else None,
-                'url': embed.url,
-                'timestamp': embed.timestamp,
-                'author': {
-                    'name': embed.author.name if embed.author else None,
-                    'icon_url': embed.author.icon_url if embed.author else None
-                },
-                'footer': {
-                    'text': await async_translate_text(embed.footer.text) if embed.footer and embed.footer.text else None,
-                    'icon_url': embed.footer.icon_url if embed.footer else None
-                },
-                'image': embed.image.url if embed.image else None,
-                'thumbnail': embed.thumbnail.url if embed.thumbnail else None,
-                'fields': []
-            }
+            embed_data = EmbedParts(
+                title=embed.title or "",
+                description=embed.description or "",
+                color=embed.color.value if embed.color else None,
+                url=embed.url,
+                timestamp=embed.timestamp,
+                author=EmbedAuthor(
+                    name=embed.author.name if embed.author else None,
+                    icon_url=embed.author.icon_url if embed.author else None
+                ),
+                footer=EmbedFooter(
+                    text=embed.footer.text if embed.footer and embed.footer.text else None,
+                    icon_url=embed.footer.icon_url if embed.footer else None
+                ),
+                image=embed.image.url if embed.image else None,
+                thumbnail=embed.thumbnail.url if embed.thumbnail else None,
+                fields=[]
+            )
+            if embed_data['title']: slots.append((embed_data, 'title'))
+            if embed_data['description']: slots.append((embed_data, 'description'))
+            if embed_data['footer']['text']: slots.append((embed_data['footer'], 'text'))
             for field in embed.fields:
-                embed_data['fields'].append({
-                    'name': await async_translate_text(field.name) if field.name else "",
-                    'value': await async_translate_text(field.value) if field.value else "",
-                    'inline': field.inline
-                })
+                field_data = FieldParts(name=field.name or "", value=field.value or "", inline=field.inline)
+                if field_data['name']: slots.append((field_data, 'name'))
+                if field_data['value']: slots.append((field_data, 'value'))
+                embed_data['fields'].append(field_data)
             parts['embeds'].append(embed_data)
         else:
             # 链接预览，提取图片
@@ -205,8 +1426,37 @@ async def process_message_content(message):
             elif embed.thumbnail:
                 parts['image_urls'].append(embed.thumbnail.url)
 
-    print(f"[IMG_DEBUG] ✅ 提取完成. 当前图片队列数: {len(parts['image_urls'])}")
-    return parts, original_raw_content
+    logger.debug(f"[IMG_DEBUG] ✅ 提取完成. 当前图片队列数: {len(parts['image_urls'])}")
+    return parts, slots
+
+def fill_slots(parts, slots, results):
+    texts = [container[key] for container, key in slots]
+    for (container, key), result in zip(slots, results):
+        container[key] = result
+    parts['segments'] = list(zip(texts, results))
+
+async def process_message_content(message, previous=None, target=DEFAULT_TARGET_LANGUAGE):
+    """提取和翻译消息：先收集所有待翻译片段，一次批量翻译后再写回。
+    previous 为上次转发时的 (原文, 译文) 列表 (编辑同步)，只翻译有变化的部分"""
+    parts, slots = extract_message_parts(message)
+    if slots:
+        texts = [container[key] for container, key in slots]
+        if previous is None:
+            results = await async_translate_batch(texts, message.channel.id, target)
+        else:
+            results = await translate_changed(texts, previous, message.channel.id, target)
+        fill_slots(parts, slots, results)
+    return parts, message.content or ""
+
+async def process_message_targets(message, targets):
+    """多目标语言：一次提取和批量翻译得到所有目标语言的译文，返回 ({目标语言: parts}, 原始内容)"""
+    extracted = {target: extract_message_parts(message) for target in targets}
+    slots = extracted[targets[0]][1]
+    if slots:
+        results = await async_translate_multi([container[key] for container, key in slots], targets, message.channel.id)
+        for target, (parts, target_slots) in extracted.items():
+            fill_slots(parts, target_slots, results[target])
+    return {target: parts for target, (parts, _) in extracted.items()}, message.content or ""
 
 def apply_output_style(parts, style):
     if style == 'auto': return parts 
@@ -230,16 +1480,14 @@ def apply_output_style(parts, style):
 
     if style == 'embed':
         if not parts['embeds'] and (parts['content'] or parts['image_urls']):
-            new_embed = {
-                'title': "", 'description': parts['content'], 'color': 0x2b2d31, 
-                'url': None, 'timestamp': None,
-                'author': {'name': None, 'icon_url': None}, 'footer': {'text': None, 'icon_url': None},
-                'image': None, 'thumbnail': None, 'fields': []
-            }
+            new_embed = EmbedParts(
+                title="", description=parts['content'], color=0x2b2d31,
+                author=EmbedAuthor(), footer=EmbedFooter(), fields=[]
+            )
             # 设置主图
             if parts['image_urls']:
                 new_embed['image'] = parts['image_urls'][0]
-                print(f"[IMG_DEBUG] 🖼️ 设置 Embed 主图: {parts['image_urls'][0]}")
+                logger.debug(f"[IMG_DEBUG] 🖼️ 设置 Embed 主图: {parts['image_urls'][0]}")
                 parts['image_urls'] = parts['image_urls'][1:] 
             
             parts['embeds'].append(new_embed)
@@ -262,135 +1510,770 @@ def rebuild_embeds(embed_data_list):
         embeds.append(embed)
     return embeds
 
+# ==================== Webhook 注册表 ====================
+
+class WebhookRegistry:
+    """频道 -> 翻译 webhook。ID/token 持久化到 DATA_DIR，重启后用 Webhook.partial 直接复用，
+    不再需要 channel.webhooks() 请求；webhook 被管理员删除 (404) 时失效并自动重建；
+    同一频道冷启动时多条消息并发请求，只会查询/创建一次"""
+
+    def __init__(self, path, max_live=WEBHOOK_CACHE_SIZE):
+        self.path = path
+        self.max_live = max_live
+        self._stored = {}    # str 频道 ID -> {'id': ..., 'token': ...}
+        self._live = OrderedDict()  # int 频道 ID -> Webhook (LRU，淘汰后可从 _stored 重建)
+        self._owners = {}    # webhook ID -> int 频道 ID
+        self._creating = {}  # int 频道 ID -> Future (进行中的查询/创建)
+
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._stored = json.load(f)
+            for cid, entry in self._stored.items():
+                self._owners[entry['id']] = int(cid)
+                own_webhook_ids.add(entry['id'])
+            logger.info(f"📂 Webhook 注册表已加载: {len(self._stored)} 个")
+        except Exception as e:
+            logger.error(f"❌ Webhook 注册表加载失败: {e}")
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._stored, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ Webhook 注册表保存失败: {e}")
+
+    def rehydrate(self):
+        """登录后调用：为已保存的 webhook 构造 partial 对象 (不发起 REST 请求)，最多 max_live 个"""
+        for cid in list(self._stored)[:self.max_live]:
+            self._cached(int(cid))
+
+    def _remember(self, channel_id, webhook):
+        self._live[channel_id] = webhook
+        self._live.move_to_end(channel_id)
+        while len(self._live) > self.max_live:
+            self._live.popitem(last=False)
+        return webhook
+
+    def _cached(self, channel_id):
+        """取内存中的 webhook；已被 LRU 淘汰的按保存的 ID/token 重建 (不发起 REST 请求)"""
+        webhook = self._live.get(channel_id)
+        if webhook:
+            self._live.move_to_end(channel_id)
+            return webhook
+        entry = self._stored.get(str(channel_id))
+        if entry: return self._remember(channel_id, discord.Webhook.partial(entry['id'], entry['token'], client=bot))
+        return None
+
+    def _register(self, channel_id, webhook):
+        self._remember(channel_id, webhook)
+        self._owners[webhook.id] = channel_id
+        own_webhook_ids.add(webhook.id)
+        entry = {'id': webhook.id, 'token': webhook.token}
+        if self._stored.get(str(channel_id)) != entry:
+            self._stored[str(channel_id)] = entry
+            self.save()
+
+    def channel_of(self, webhook_id):
+        return self._owners.get(webhook_id)
+
+    def find(self, webhook_id):
+        """按 ID 取当前仍在使用的 webhook；已被重建的旧 webhook 返回 None"""
+        channel_id = self._owners.get(webhook_id)
+        webhook = self._cached(channel_id) if channel_id is not None else None
+        return webhook if webhook and webhook.id == webhook_id else None
+
+    def invalidate(self, webhook_id):
+        """webhook 已失效 (404 / Unknown Webhook)，移除后下次 get 会重建"""
+        channel_id = self._owners.pop(webhook_id, None)
+        own_webhook_ids.discard(webhook_id)
+        if channel_id is None: return None
+        if self._live.get(channel_id) and self._live[channel_id].id == webhook_id:
+            del self._live[channel_id]
+        if self._stored.get(str(channel_id), {}).get('id') == webhook_id:
+            del self._stored[str(channel_id)]
+            self.save()
+        return channel_id
+
+    async def get(self, channel):
+        webhook = self._cached(channel.id)
+        if webhook: return webhook
+        fut = self._creating.get(channel.id)
+        if fut: return await asyncio.shield(fut)
+        fut = self._creating[channel.id] = asyncio.get_running_loop().create_future()
+        webhook = None
+        try:
+            webhook = await self._fetch_or_create(channel)
+            if webhook: self._register(channel.id, webhook)
+        finally:
+            fut.set_result(webhook)
+            del self._creating[channel.id]
+        return webhook
+
+    async def _fetch_or_create(self, channel):
+        try:
+            webhooks = await channel.webhooks()
+            for wh in webhooks:
+                if wh.token: return wh
+            return await channel.create_webhook(name="Translation Hook")
+        except Exception as e:
+            logger.error(f"❌ Webhook 获取失败: {e}")
+            return None
+
+webhook_registry = WebhookRegistry(WEBHOOK_FILE)
+
 async def get_webhook(channel):
-    if channel.id in webhook_cache: return webhook_cache[channel.id]
+    return await webhook_registry.get(channel)
+
+UNKNOWN_CHANNEL = 10003
+UNKNOWN_WEBHOOK = 10015
+
+async def execute_webhook(webhook, **kwargs):
+    """发送；webhook 已被删除 (10015) 时失效注册表条目，重建后重发一次。
+    目标子区已被删除 (10003) 时 webhook 本身仍然有效，只跳过这个目标"""
     try:
-        webhooks = await channel.webhooks()
-        for wh in webhooks:
-            if wh.token: 
-                webhook_cache[channel.id] = wh
-                return wh
-        new_wh = await channel.create_webhook(name="Translation Hook")
-        webhook_cache[channel.id] = new_wh
-        return new_wh
-    except Exception as e:
-        print(f"❌ Webhook 获取失败: {e}")
-        return None
+        return await webhook.send(**kwargs)
+    except discord.NotFound as e:
+        if e.code == UNKNOWN_CHANNEL and kwargs.get('thread'):
+            logger.warning(f"⚠️ 目标子区 {kwargs['thread'].id} 已不存在，跳过")
+            return None
+        if e.code != UNKNOWN_WEBHOOK: raise
+        channel_id = webhook_registry.invalidate(webhook.id)
+        channel = bot.get_channel(channel_id) if channel_id else None
+        if not channel: raise
+        logger.warning(f"⚠️ Webhook 已失效，正在为频道 {channel_id} 重建")
+        fresh = await webhook_registry.get(channel)
+        if not fresh: raise
+        return await fresh.send(**kwargs)
 
-async def send_translated_content(webhook, parts, display_name, avatar_url):
-    send_kwargs = {'username': display_name, 'avatar_url': avatar_url, 'wait': True}
+def render_parts(parts):
+    """parts -> (最终文本, Embed 列表)，发送和编辑共用"""
     final_content = parts['content']
     if parts['image_urls']:
         if final_content: final_content += "\n"
         final_content += "\n".join(parts['image_urls'])
-    embeds_obj = rebuild_embeds(parts['embeds'])
+    return final_content, rebuild_embeds(parts['embeds'])
+
+async def send_translated_content(webhook, parts, display_name, avatar_url, wait=False, thread=None):
+    """交给出站调度器排队发送；只有镜像模式需要发送后的消息 ID (wait=True)，其余用 wait=False 省掉响应体"""
+    send_kwargs = {'username': display_name, 'avatar_url': avatar_url, 'wait': wait}
+    if thread: send_kwargs['thread'] = thread
+    final_content, embeds_obj = render_parts(parts)
     
     if embeds_obj and embeds_obj[0].image:
-        print(f"[IMG_DEBUG] 🚀 最终 Embed 包含 Image: {embeds_obj[0].image.url}")
+        logger.debug(f"[IMG_DEBUG] 🚀 最终 Embed 包含 Image: {embeds_obj[0].image.url}")
     
     if final_content or embeds_obj:
-        try: await webhook.send(content=final_content, embeds=embeds_obj, **send_kwargs)
-        except Exception as e: print(f"❌ 发送失败: {e}")
+        return await outbound.send(webhook, content=final_content, embeds=embeds_obj, **send_kwargs)
+
+# ==================== 出站限流调度 ====================
+
+def parse_rate(value):
+    """'5/2' -> (5 次, 2 秒)"""
+    count, _, per = value.partition('/')
+    return int(count), float(per or 1)
+
+class RateBucket:
+    """令牌桶：每 per 秒最多 capacity 次请求；收到 429 时整体暂停到 retry_after 之后"""
+
+    def __init__(self, capacity, per):
+        self.capacity = capacity
+        self.per = per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def block(self, retry_after):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    async def acquire(self):
+        """取一个令牌，返回因限流等待的秒数"""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+            self.updated = now
+            if now < self.blocked_until:
+                delay = self.blocked_until - now
+            elif self.tokens >= 1:
+                self.tokens -= 1
+                return waited
+            else:
+                delay = (1 - self.tokens) * self.per / self.capacity
+            await asyncio.sleep(delay)
+            waited += delay
+
+class PendingCounter:
+    """多个队列中已提交、尚未处理完的任务总数，降为 0 时唤醒 join()"""
+
+    def __init__(self):
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def add(self):
+        self.count += 1
+        self._idle.clear()
+
+    def done(self):
+        self.count -= 1
+        if not self.count: self._idle.set()
+
+    async def wait(self):
+        await self._idle.wait()
+
+OUTBOUND_FAILED = object()  # 出站请求失败时 Future 的结果 (成功但没有返回值时为 None)
+
+class OutboundScheduler:
+    """webhook 发送和消息删除的出站调度：按 Discord 路由分桶 (每个 webhook / 每个频道的删除)，
+    每个桶一个 FIFO worker 按速率放行，不同桶之间并行，避免撞上 429 后 discord.py 内部整体等待"""
+
+    def __init__(self, webhook_rate, delete_rate, queue_size, idle_timeout=60.0):
+        self.webhook_rate = webhook_rate
+        self.delete_rate = delete_rate
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.throttled_seconds = 0.0
+        self.rate_limited = 0
+        self._pending = PendingCounter()
+        self._lanes = {}  # (类型, id) -> (Queue, RateBucket, Task)
+
+    async def send(self, webhook, **kwargs):
+        job = functools.partial(execute_webhook, webhook, **kwargs)
+        return await self.submit(('webhook', webhook.id), self.webhook_rate, job, 'send', webhook_registry.channel_of(webhook.id))
+
+    async def delete(self, message):
+        return await self.submit(('delete', message.channel.id), self.delete_rate, message.delete, 'delete', message.channel.id)
+
+    async def edit(self, webhook, message_id, **kwargs):
+        """编辑/删除 webhook 发出的消息，与发送共用同一个 webhook 桶"""
+        job = functools.partial(webhook.edit_message, message_id, **kwargs)
+        return await self.submit(('webhook', webhook.id), self.webhook_rate, job, 'edit', webhook_registry.channel_of(webhook.id))
+
+    async def delete_relayed(self, webhook, message_id):
+        job = functools.partial(webhook.delete_message, message_id)
+        return await self.submit(('webhook', webhook.id), self.webhook_rate, job, 'delete', webhook_registry.channel_of(webhook.id))
+
+    async def submit(self, key, rate, job, stage, channel=None):
+        """排入对应桶的队列 (队列满时等待)，返回结果 Future；失败只记录日志，结果为 OUTBOUND_FAILED"""
+        lane = self._lanes.get(key)
+        if lane is None:
+            queue, bucket = asyncio.Queue(self.queue_size), RateBucket(*rate)
+            lane = self._lanes[key] = (queue, bucket, asyncio.create_task(self._worker(key, queue, bucket)))
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.add()
+        try:
+            await lane[0].put((job, fut, stage, channel))
+        except BaseException:
+            self._pending.done()
+            raise
+        return fut
+
+    async def _worker(self, key, queue, bucket):
+        try:
+            while True:
+                try:
+                    job, fut, stage, channel = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty(): return
+                    continue
+                self.throttled_seconds += await bucket.acquire()
+                result = OUTBOUND_FAILED
+                try:
+                    with metrics.timer(stage, channel):
+                        result = await job()
+                except discord.HTTPException as e:
+                    if e.status == 429:
+                        self.rate_limited += 1
+                        metrics.inc('rate_limited', channel=channel)
+                        bucket.block(getattr(e, 'retry_after', None) or bucket.per)
+                    logger.error(f"❌ 出站请求失败 {key}: {e}")
+                except Exception as e:
+                    logger.error(f"❌ 出站请求失败 {key}: {e}")
+                finally:
+                    if not fut.done(): fut.set_result(result)
+                    queue.task_done()
+                    self._pending.done()
+        finally:
+            self._lanes.pop(key, None)
+
+    def depth(self):
+        return sum(lane[0].qsize() for lane in self._lanes.values())
+
+    async def join(self):
+        """等待所有已排队的出站请求完成"""
+        await self._pending.wait()
+
+    def stats(self):
+        return f"出站队列 {self.depth()} | 限流等待 {self.throttled_seconds:.1f}s | 429 次数 {self.rate_limited}"
+
+outbound = OutboundScheduler(parse_rate(WEBHOOK_RATE_LIMIT), parse_rate(DELETE_RATE_LIMIT), OUTBOUND_QUEUE_SIZE)
+metrics.gauge('outbound_queue_depth', outbound.depth)
+metrics.gauge('outbound_throttled_seconds', lambda: round(outbound.throttled_seconds, 3))
+
+# ==================== 转发索引 (编辑/删除同步) ====================
+
+def parts_digest(parts):
+    """最终输出内容的短摘要：编辑后摘要不变 (例如只是展开了已有的链接预览) 就不需要编辑译文"""
+    payload = json.dumps([parts['content'], parts['embeds'], parts['image_urls']], ensure_ascii=False,
+                         default=lambda o: o.values() if isinstance(o, PartsRecord) else str(o))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=8).hexdigest()
+
+class RelayIndex:
+    """镜像模式下 原消息 ID -> (webhook ID, 译文消息 ID, 内容摘要, 各片段 (原文, 译文))。
+    内存层是按条数淘汰的 LRU，条目用元组保存；开启落盘时同时写入 SQLite，
+    内存淘汰或重启后仍可从磁盘层查到，超过保留期的记录在启动时清理。磁盘读写放在线程池中执行"""
+
+    def __init__(self, max_size, path=None, retention=7 * 86400):
+        self.max_size = max_size
+        self.path = path
+        self.retention = retention
+        self.pending = {}           # 原消息 ID -> 等待发送结果并写入索引的 Task
+        self._data = OrderedDict()  # 原消息 ID -> (webhook_id, relay_id, digest, pairs)
+        self._db = None
+        self._db_lock = threading.Lock()
+
+    def open(self):
+        if not self.path or self._db: return
+        try:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')  # 分片模式下多个进程共用同一个文件
+            with self._db_lock, self._db:
+                self._db.execute('CREATE TABLE IF NOT EXISTS relay (source_id INTEGER PRIMARY KEY, webhook_id INTEGER, '
+                                 'relay_id INTEGER, digest TEXT, pairs TEXT, created REAL)')
+                expired = self._db.execute('DELETE FROM relay WHERE created < ?', (time.time() - self.retention,)).rowcount
+            logger.info(f"📂 转发索引已打开 (清理过期记录 {expired} 条)")
+        except Exception as e:
+            logger.error(f"❌ 转发索引打开失败，仅使用内存: {e}")
+            self._db = None
+
+    def close(self):
+        if not self._db: return
+        with self._db_lock:
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remember(self, source_id, entry):
+        self._data[source_id] = entry
+        self._data.move_to_end(source_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def _db_write(self, source_id, entry):
+        webhook_id, relay_id, digest, pairs = entry
+        try:
+            with self._db_lock, self._db:
+                self._db.execute('INSERT OR REPLACE INTO relay VALUES (?, ?, ?, ?, ?, ?)',
+                                 (source_id, webhook_id, relay_id, digest, json.dumps(pairs, ensure_ascii=False), time.time()))
+        except Exception as e:
+            logger.error(f"❌ 转发索引写入失败: {e}")
+
+    def _db_read(self, source_id):
+        with self._db_lock:
+            row = self._db.execute('SELECT webhook_id, relay_id, digest, pairs FROM relay WHERE source_id = ?', (source_id,)).fetchone()
+        if row is None: return None
+        return row[0], row[1], row[2], tuple(tuple(pair) for pair in json.loads(row[3]))
+
+    def _db_delete(self, source_id):
+        with self._db_lock, self._db:
+            self._db.execute('DELETE FROM relay WHERE source_id = ?', (source_id,))
+
+    async def put(self, source_id, webhook_id, relay_id, digest, pairs):
+        entry = (webhook_id, relay_id, digest, tuple(pairs))
+        self._remember(source_id, entry)
+        if self._db:
+            await asyncio.get_running_loop().run_in_executor(None, self._db_write, source_id, entry)
+
+    def track(self, source_id, webhook_id, parts, sent):
+        """发送已排队：等出站 Future 返回译文消息后写入索引；期间到达的编辑/删除会先等它完成"""
+        self.pending[source_id] = asyncio.create_task(
+            self._record(source_id, webhook_id, parts_digest(parts), parts['segments'], sent))
+
+    async def _record(self, source_id, webhook_id, digest, pairs, sent):
+        try:
+            relayed = await sent
+            if relayed and relayed is not OUTBOUND_FAILED: await self.put(source_id, webhook_id, relayed.id, digest, pairs)
+        finally:
+            self.pending.pop(source_id, None)
+
+    async def get(self, source_id):
+        task = self.pending.get(source_id)
+        if task: await asyncio.shield(task)
+        entry = self._data.get(source_id)
+        if entry:
+            self._data.move_to_end(source_id)
+            return entry
+        if not self._db: return None
+        entry = await asyncio.get_running_loop().run_in_executor(None, self._db_read, source_id)
+        if entry: self._remember(source_id, entry)
+        return entry
+
+    async def pop(self, source_id):
+        entry = await self.get(source_id)
+        if entry is None: return None
+        self._data.pop(source_id, None)
+        if self._db:
+            await asyncio.get_running_loop().run_in_executor(None, self._db_delete, source_id)
+        return entry
+
+relay_index = RelayIndex(RELAY_INDEX_SIZE, RELAY_INDEX_FILE if RELAY_INDEX_PERSIST else None, RELAY_INDEX_RETENTION_DAYS * 86400)
+metrics.gauge('relay_index_entries', lambda: len(relay_index))
+
+# ==================== 链接预览等待 ====================
+# 尖括号包裹的链接 <https://...> 不会生成预览，不需要等待
+PREVIEW_URL_RE = re.compile(r'(?<!<)https?://\S+')
+preview_waiters = {}  # message_id -> Future，由编辑/删除事件唤醒
+PREVIEW_TIMED_OUT = object()
+
+def needs_link_preview(message):
+    if message.attachments or message.embeds or message.flags.suppress_embeds: return False
+    return bool(PREVIEW_URL_RE.search(message.content or ""))
+
+def watch_link_preview(message):
+    """在 on_message 中、入队之前登记：消息还在频道队列里排队时到达的预览编辑也不会错过
+    (LEAN_MAX_MESSAGES=0 时没有消息缓存替我们原地更新 embeds)。
+    超时从消息到达时开始计算，到期自动移除登记，被丢弃的消息不会残留"""
+    if not needs_link_preview(message): return None
+    loop = asyncio.get_running_loop()
+    fut = preview_waiters[message.id] = loop.create_future()
+    loop.call_later(PREVIEW_WAIT_TIMEOUT, expire_link_preview, message.id, fut)
+    return fut
+
+def expire_link_preview(message_id, fut):
+    if preview_waiters.get(message_id) is fut: del preview_waiters[message_id]
+    if not fut.done(): fut.set_result(PREVIEW_TIMED_OUT)
+
+async def wait_for_link_preview(message, fut):
+    """等待链接预览生成 (频道 worker 在占用全局并发名额之前调用)，返回 False 表示消息在等待期间被删除"""
+    logger.debug(f"[DELAY] ⏳ 等待链接预览加载... (Message ID: {message.id})")
+    with metrics.timer('preview_wait', message.channel.id):
+        embeds = await fut
+    if preview_waiters.get(message.id) is fut: del preview_waiters[message.id]
+    if embeds is PREVIEW_TIMED_OUT:
+        metrics.inc('preview_timeouts', channel=message.channel.id)
+        logger.debug(f"[DELAY] ⌛ 预览等待超时，按原样处理 (Message ID: {message.id})")
+        return True
+    if embeds is None:
+        logger.debug(f"[DELAY] ⚠️ 等待预览期间消息已删除 (Message ID: {message.id})")
+        return False
+    message.embeds = embeds
+    logger.debug(f"[DELAY] 🔄 收到链接预览。当前 Embeds 数: {len(message.embeds)}")
+    return True
+
+# ==================== 频道有序队列 ====================
+
+class ChannelDispatcher:
+    """每个频道一个 FIFO 队列和一个 worker，保证同频道内按顺序转发；
+    全局信号量限制跨频道的总并发，队列满时按策略丢弃或等待 (背压)"""
+
+    def __init__(self, max_concurrency, queue_size, overflow_policy, idle_timeout=60.0):
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.idle_timeout = idle_timeout
+        self.dropped = 0
+        self._pending = PendingCounter()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queues = {}   # channel_id -> asyncio.Queue
+        self._workers = {}  # channel_id -> Task
+
+    async def submit(self, channel_id, job, prepare=None):
+        """job 为无参异步函数；prepare 为可选的无参异步函数，在占用全局并发名额之前执行 (例如等待链接预览)，
+        返回 False 时跳过 job。返回 False 表示因队列满被丢弃"""
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = asyncio.Queue(self.queue_size)
+            self._workers[channel_id] = asyncio.create_task(self._worker(channel_id, queue))
+        if queue.full():
+            if self.overflow_policy == 'drop_newest':
+                self.dropped += 1
+                metrics.inc('messages_dropped', channel=channel_id)
+                logger.warning(f"⚠️ 频道 {channel_id} 队列已满，丢弃新消息")
+                return False
+            if self.overflow_policy == 'drop_oldest':
+                queue.get_nowait()
+                queue.task_done()
+                self._pending.done()
+                self.dropped += 1
+                metrics.inc('messages_dropped', channel=channel_id)
+                logger.warning(f"⚠️ 频道 {channel_id} 队列已满，丢弃最早的消息")
+            # 'defer'：等待队列有空位，形成背压
+        self._pending.add()
+        try:
+            await queue.put((prepare, job))
+        except BaseException:
+            self._pending.done()
+            raise
+        return True
+
+    async def _worker(self, channel_id, queue):
+        try:
+            while True:
+                try:
+                    prepare, job = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty(): return  # 空闲频道回收 worker
+                    continue
+                try:
+                    if prepare and not await prepare(): continue
+                    async with self._semaphore:
+                        await job()
+                except Exception as e:
+                    logger.error(f"❌ 频道 {channel_id} 处理消息异常: {e}")
+                finally:
+                    queue.task_done()
+                    self._pending.done()
+        finally:
+            self._queues.pop(channel_id, None)
+            self._workers.pop(channel_id, None)
+
+    def depths(self):
+        return {cid: q.qsize() for cid, q in self._queues.items()}
+
+    async def join(self):
+        """等待所有频道队列处理完毕"""
+        await self._pending.wait()
+
+channel_dispatcher = ChannelDispatcher(MAX_CONCURRENT_MESSAGES, CHANNEL_QUEUE_SIZE, QUEUE_OVERFLOW_POLICY)
+metrics.gauge('channel_queue_depth', lambda: sum(channel_dispatcher.depths().values()))
+
+# ==================== 启动初始化 ====================
+
+async def initialize():
+    """只执行一次：加载配置和各类持久化状态，预热路由/webhook/翻译后端，按需同步 Slash 命令"""
+    global _config_watcher
+    load_config()
+    translation_cache.load()
+    webhook_registry.load()
+    relay_index.open()
+    rebuild_routing_index()
+    webhook_registry.rehydrate()
+    get_translation_backend()
+    if SHARD_COUNT:
+        _config_watcher = asyncio.create_task(watch_config())
+        logger.info(f"🧩 分片模式: 共 {SHARD_COUNT} 个分片，本进程负责 {SHARD_IDS or '全部'}")
+    # 全局命令只需由负责分片 0 的进程同步一次
+    if not SHARD_IDS or 0 in SHARD_IDS:
+        await sync_command_tree()
+
+def command_tree_hash():
+    """当前 Slash 命令 / 右键菜单定义 (连同应用 ID) 的哈希"""
+    commands_data = sorted((cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands()), key=lambda c: (c.get('type', 1), c['name']))
+    payload = json.dumps([bot.application_id, commands_data], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+async def sync_command_tree():
+    """全局命令 upsert 限流很严：定义与上次同步时相同就跳过"""
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE, 'r', encoding='utf-8') as f:
+            if f.read().strip() == digest:
+                logger.info("⏭️ Slash 命令定义未变化，跳过同步")
+                return
+    except FileNotFoundError:
+        pass
+    try:
+        synced = await bot.tree.sync()
+    except Exception as e:
+        logger.error(f"❌ Slash 命令同步失败: {e}")
+        return
+    tmp_path = COMMAND_HASH_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(digest)
+        os.replace(tmp_path, COMMAND_HASH_FILE)
+    except Exception as e:
+        logger.error(f"❌ 命令哈希保存失败: {e}")
+    logger.info(f"🔄 已同步 {len(synced)} 个 Slash 命令")
 
 # ==================== 事件处理 ====================
 
 @bot.event
 async def on_ready():
-    print(f'🚀 {bot.user} 已上线！')
-    load_config() 
-    try: await bot.tree.sync()
-    except: pass
+    # 重连时也会触发：状态已在 setup_hook 中初始化，这里不再读盘或同步命令
+    logger.info(f'🚀 {bot.user} 已上线！')
+
+def is_mirror_channel(channel_id):
+    route = routing_index.get(channel_id)
+    return bool(route) and route['mode'] == 'mirror'
+
+@bot.event
+async def on_raw_message_edit(payload):
+    fut = preview_waiters.get(payload.message_id)
+    if fut and not fut.done() and payload.message.embeds:
+        fut.set_result(payload.message.embeds)
+    # 镜像模式：排在同频道队列里，保证在原消息的转发之后处理
+    message = payload.message
+    if is_mirror_channel(payload.channel_id) and message.author != bot.user and message.webhook_id not in own_webhook_ids:
+        await channel_dispatcher.submit(payload.channel_id, functools.partial(relay_edit, message))
+
+@bot.event
+async def on_raw_message_delete(payload):
+    fut = preview_waiters.get(payload.message_id)
+    if fut and not fut.done():
+        fut.set_result(None)
+    if is_mirror_channel(payload.channel_id):
+        await channel_dispatcher.submit(payload.channel_id, functools.partial(relay_delete, payload.message_id))
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    if not is_mirror_channel(payload.channel_id): return
+    for message_id in payload.message_ids:
+        await channel_dispatcher.submit(payload.channel_id, functools.partial(relay_delete, message_id))
 
 @bot.event
 async def on_message(message):
     if message.author == bot.user: return
+    # 自己 webhook 的回显：无需任何 API 调用即可丢弃
+    if message.webhook_id and message.webhook_id in own_webhook_ids: return
     if not isinstance(message.channel, discord.TextChannel): return
     if message.content and message.content.startswith('/'):
         await bot.process_commands(message)
         return
-    if message.webhook_id:
-        current_wh = await get_webhook(message.channel)
-        if current_wh and message.webhook_id == current_wh.id: return
 
-    cid = str(message.channel.id)
+    # 未配置的频道到此为止，不产生网络请求
+    route = routing_index.get(message.channel.id)
+    if route is None:
+        await bot.process_commands(message)
+        return
+
     uid = str(message.author.id)
     name = message.author.display_name 
-    
-    channel_mappings = global_config["bot_mappings"].get(cid, {})
-    target_config = channel_mappings.get(uid) or channel_mappings.get(name)
-    channel_mode = global_config["channel_modes"].get(cid, 'off')
-    output_style = global_config["output_styles"].get(cid, 'auto')
-    processing_scope = global_config["processing_scopes"].get(cid, 'translate_only')
+    target_config = route['mappings'].get(uid) or route['mappings'].get(name)
+    channel_mode = route['mode']
+    output_style = route['style']
+    processing_scope = route['scope']
 
     if not target_config and channel_mode == 'off':
         await bot.process_commands(message)
         return
+    metrics.inc('messages_received', channel=message.channel.id)
+
+    # 已配置频道里来自未知 webhook 的消息：确认是否为本频道的翻译 webhook (之后会记入 own_webhook_ids)
+    if message.webhook_id:
+        with metrics.timer('webhook_lookup', message.channel.id):
+            current_wh = await get_webhook(message.channel)
+        if current_wh and message.webhook_id == current_wh.id: return
 
     # 【修复图片丢失核心逻辑】
-    # 如果消息没有显式附件，也没有Embeds，但内容不为空（可能是链接）
-    # 我们等待 2 秒，让 Discord 有时间生成预览图
-    if not message.attachments and not message.embeds and message.content:
-        print(f"[DELAY] ⏳ 等待链接预览加载... (Message ID: {message.id})")
-        await asyncio.sleep(2.0) 
-        try:
-            # 重新获取消息最新状态
-            message = await message.channel.fetch_message(message.id)
-            print(f"[DELAY] 🔄 重新获取消息成功。当前 Embeds 数: {len(message.embeds)}")
-        except Exception as e:
-            print(f"[DELAY] ⚠️ 重新获取消息失败 (可能已删除): {e}")
-            return # 如果原消息没了，就停止处理
+    # 如果消息没有显式附件，也没有Embeds，但内容里有链接
+    # 等待 Discord 通过编辑事件推送预览图 (有超时)，纯文本消息不等待；原消息被删除则停止处理
+    preview = watch_link_preview(message)
+
+    # 放入本频道的有序队列，由频道 worker 依次处理
+    await channel_dispatcher.submit(message.channel.id, functools.partial(
+        relay_message, message, target_config, channel_mode, output_style, processing_scope, route['targets']
+    ), functools.partial(wait_for_link_preview, message, preview) if preview else None)
 
+async def relay_message(message, target_config, channel_mode, output_style, processing_scope, targets):
+    """翻译并转发单条消息 (在频道 worker 中按顺序执行)。
+    多个目标语言共用一次提取/清洗/判定和一轮批量翻译，各语言的译文并发发出"""
     try:
-        parts, original_raw_content = await process_message_content(message)
+        translations, original_raw_content = await process_message_targets(message, list(targets))
     except: return
-    
-    should_send = False
-    
-    if target_config:
-        should_send = True
-        parts = apply_output_style(parts, output_style)
-    else:
-        original_clean = clean_text(original_raw_content).strip()
-        trans_clean = (parts['content'] or "").strip()
-        has_text_change = (original_clean != trans_clean)
-        has_media = bool(message.embeds or message.attachments)
-        
-        if processing_scope == 'all_messages':
-            if original_clean or has_media:
-                should_send = True
-        else: 
-            if has_text_change:
-                should_send = True
-            elif has_media and not has_text_change:
-                should_send = False
+
+    original_clean = clean_text(original_raw_content).strip()
+    has_media = bool(message.embeds or message.attachments)
+    outputs = []  # (目标语言, parts)
+
+    for target, parts in translations.items():
+        should_send = False
+        if target_config:
+            should_send = True
+        else:
+            trans_clean = (parts['content'] or "").strip()
+            has_text_change = (original_clean != trans_clean)
+
+            if processing_scope == 'all_messages':
+                if original_clean or has_media:
+                    should_send = True
+            else:
+                if has_text_change:
+                    should_send = True
+                elif has_media and not has_text_change:
+                    should_send = False
 
         if should_send:
-            parts = apply_output_style(parts, output_style)
+            outputs.append((target, apply_output_style(parts, output_style)))
 
-    if not should_send:
+    if not outputs:
         await bot.process_commands(message)
         return
 
-    log(f"⚡ 转发消息: [{message.author.display_name}]")
+    logger.debug(f"⚡ 转发消息: [{message.author.display_name}] -> {[target for target, _ in outputs]}")
     
-    webhook = await get_webhook(message.channel)
-    if webhook:
-        if target_config:
-            s_name, s_avatar = target_config['name'], target_config['avatar']
-            try: await message.delete()
-            except: pass
-        else:
-            s_name, s_avatar = message.author.display_name, (message.author.avatar.url if message.author.avatar else None)
-            if channel_mode == 'replace':
-                try: await message.delete()
-                except: pass
-
-        await send_translated_content(webhook, parts, s_name, s_avatar)
+    metrics.inc('messages_relayed', channel=message.channel.id)
+    if target_config:
+        s_name, s_avatar = target_config['name'], target_config['avatar']
     else:
-        if target_config or channel_mode == 'replace':
-            try: await message.delete()
-            except: pass
-        # 降级发送略...
+        s_name, s_avatar = message.author.display_name, (message.author.avatar.url if message.author.avatar else None)
+    # 删除原消息和发送译文分别走不同的限流桶，并行进行；
+    # 发送只排队不等待完成，同一 webhook 的 FIFO 保证了频道内的顺序
+    # 镜像模式保留原消息，并记下本频道主译文的消息 ID，之后原消息的编辑/删除会同步过去
+    mirror = channel_mode == 'mirror'
+    if (target_config and not mirror) or channel_mode == 'replace':
+        await outbound.delete(message)
+    primary = primary_target(targets) if mirror else None
+    sends = [send_to_destination(message, targets[target], parts, s_name, s_avatar, track=(target == primary))
+             for target, parts in outputs]
+    if len(sends) == 1: await sends[0]
+    else: await asyncio.gather(*sends)  # 多个目标语言：各自的 webhook 出站桶并行排队
+
+def primary_target(targets):
+    """发在本频道的第一个目标语言，镜像模式的编辑/删除同步针对它的译文"""
+    return next((target for target, destination in targets.items() if destination is None), None)
+
+async def send_to_destination(message, destination, parts, display_name, avatar_url, track=False):
+    """发到本频道或指定的频道/子区 (子区使用父频道的 webhook)"""
+    channel = bot.get_channel(destination) if destination else message.channel
+    if channel is None:
+        logger.warning(f"⚠️ 目标频道 {destination} 不可用，跳过")
+        return
+    thread = channel if isinstance(channel, discord.Thread) else None
+    with metrics.timer('webhook_lookup', message.channel.id):
+        webhook = await get_webhook(thread.parent if thread else channel)
+    if not webhook: return  # 降级发送略...
+    sent = await send_translated_content(webhook, parts, display_name, avatar_url, wait=track, thread=thread)
+    if track and sent: relay_index.track(message.id, webhook.id, parts, sent)
+
+async def relay_edit(message):
+    """镜像模式：原消息被编辑后，只重新翻译变化的段落/字段，再编辑对应的译文消息"""
+    entry = await relay_index.get(message.id)
+    if entry is None: return
+    webhook_id, relay_id, digest, pairs = entry
+    webhook = webhook_registry.find(webhook_id)
+    if not webhook: return  # webhook 已重建，旧 webhook 发出的消息无法再编辑
+    route = routing_index.get(message.channel.id)
+    target = primary_target(route['targets']) if route else None
+    if target is None: return
+    try:
+        parts, _ = await process_message_content(message, previous=pairs, target=target)
+    except: return
+    parts = apply_output_style(parts, route['style'])
+    new_digest = parts_digest(parts)
+    if new_digest == digest: return  # 输出没有变化 (例如只是展开了链接预览)
+    final_content, embeds_obj = render_parts(parts)
+    if not final_content and not embeds_obj: return
+    logger.debug(f"✏️ 同步编辑: {message.id} -> {relay_id}")
+    metrics.inc('messages_edited', channel=message.channel.id)
+    edited = await outbound.edit(webhook, relay_id, content=final_content, embeds=embeds_obj)
+    # 编辑失败时索引保持原样，仍记录译文消息实际显示的内容，下次编辑与它对比
+    if await edited is OUTBOUND_FAILED: return
+    await relay_index.put(message.id, webhook_id, relay_id, new_digest, parts['segments'])
+
+async def relay_delete(message_id):
+    """镜像模式：原消息被删除后删除对应的译文消息"""
+    entry = await relay_index.pop(message_id)
+    if entry is None: return
+    webhook = webhook_registry.find(entry[0])
+    if not webhook: return
+    logger.debug(f"🗑️ 同步删除: {message_id} -> {entry[1]}")
+    await outbound.delete_relayed(webhook, entry[1])
 
 # ==================== Slash 命令 ====================
 
@@ -402,7 +2285,7 @@ async def on_message(message):
 async def set_scope(interaction: discord.Interaction, scope: discord.app_commands.Choice[str]):
     cid = str(interaction.channel.id)
     global_config["processing_scopes"][cid] = scope.value
-    save_config()
+    config_changed(cid)
     desc = "现在机器人会**忽略中文**，只翻译英文。" if scope.value == "translate_only" else "现在机器人会**接管所有消息**，中文也会被强制应用格式 (如 Embed)。"
     await interaction.response.send_message(f"⚙️ 范围已更新: **{scope.name}**\n{desc}", ephemeral=True)
 
@@ -412,7 +2295,8 @@ async def translation_status(interaction: discord.Interaction):
     all_cids = set(global_config["channel_modes"].keys()) | \
                set(global_config["bot_mappings"].keys()) | \
                set(global_config["output_styles"].keys()) | \
-               set(global_config["processing_scopes"].keys())
+               set(global_config["processing_scopes"].keys()) | \
+               set(global_config["target_languages"].keys())
     
     if not all_cids:
         await interaction.response.send_message("💤 当前没有任何频道开启翻译或设置规则。", ephemeral=True)
@@ -425,8 +2309,10 @@ async def translation_status(interaction: discord.Interaction):
         style = global_config["output_styles"].get(cid, "Auto")
         scope = global_config["processing_scopes"].get(cid, "Translate Only")
         mappings = global_config["bot_mappings"].get(cid, {})
+        languages = global_config["target_languages"].get(cid) or {DEFAULT_TARGET_LANGUAGE: None}
+        language_text = ", ".join(f"{lang} → <#{dest}>" if dest else lang for lang, dest in languages.items())
         
-        status_text = f"**模式**: {mode}\n**样式**: {style}\n**范围**: {scope}\n"
+        status_text = f"**模式**: {mode}\n**样式**: {style}\n**范围**: {scope}\n**目标语言**: {language_text}\n"
         if mappings:
             targets = []
             for target, config in mappings.items():
@@ -435,6 +2321,7 @@ async def translation_status(interaction: discord.Interaction):
         else:
             status_text += "**监听**: 无"
         embed.add_field(name=f"📺 {channel_name}", value=status_text, inline=False)
+    embed.set_footer(text=f"{translation_cache.stats()}{' (SQLite 共享层)' if translation_cache.shared else ''}\n{outbound.stats()}\n翻译后端熔断状态: {translation_breaker.state}")
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name='set_style', description='设置本频道翻译结果的输出格式')
@@ -446,7 +2333,7 @@ async def translation_status(interaction: discord.Interaction):
 async def set_style(interaction: discord.Interaction, style: discord.app_commands.Choice[str]):
     cid = str(interaction.channel.id)
     global_config["output_styles"][cid] = style.value
-    save_config()
+    config_changed(cid)
     await interaction.response.send_message(f"🎨 本频道输出样式已设置为: **{style.name}**", ephemeral=True)
 
 @bot.tree.command(name='setup_bot_translator', description='设定：输入ID 或 名字 来指定机器人，并使用自定义头像和名字发布')
@@ -456,7 +2343,7 @@ async def setup_bot_translator(interaction: discord.Interaction, target: str, na
     if cid not in global_config["bot_mappings"]:
         global_config["bot_mappings"][cid] = {}
     global_config["bot_mappings"][cid][target_key] = {'name': name, 'avatar': avatar.url}
-    save_config()
+    config_changed(cid)
     await interaction.response.send_message(f"✅ 设定成功！监听目标: `{target_key}`", ephemeral=True)
 
 @bot.tree.command(name='clear_bot_translator', description='清除当前频道对指定目标的翻译设定')
@@ -466,23 +2353,130 @@ async def clear_bot_translator(interaction: discord.Interaction, target: str):
     mappings = global_config["bot_mappings"].get(cid, {})
     if target_key in mappings:
         del global_config["bot_mappings"][cid][target_key]
-        save_config()
+        config_changed(cid)
         await interaction.response.send_message(f"🗑️ 已移除对 `{target_key}` 的设定。", ephemeral=True)
     else:
         await interaction.response.send_message(f"⚠️ 未找到关于 `{target_key}` 的设定。", ephemeral=True)
 
+LANGUAGE_CODE_RE = re.compile(r'^[A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,4})?$')
+
+@bot.tree.command(name='add_language', description='为本频道添加一种目标语言，可指定译文发往的频道或子区')
+@discord.app_commands.describe(language='语言代码，例如 zh-CN / ja / ko', destination='译文发往的频道或子区 (留空则发在本频道)')
+async def add_language(interaction: discord.Interaction, language: str,
+                       destination: Optional[Union[discord.TextChannel, discord.Thread]] = None):
+    cid = str(interaction.channel.id)
+    language = normalize_language_code(language.strip())
+    if not LANGUAGE_CODE_RE.match(language):
+        await interaction.response.send_message(f"⚠️ 无效的语言代码: `{language}`", ephemeral=True)
+        return
+    # 整体替换频道条目，不原地修改 (后台落盘只复制两层)；已有的语言只更新发往的目标
+    languages = dict(global_config["target_languages"].get(cid) or {DEFAULT_TARGET_LANGUAGE: None})
+    language = next((known for known in languages if known.lower() == language.lower()), language)
+    languages[language] = str(destination.id) if destination else None
+    global_config["target_languages"][cid] = languages
+    config_changed(cid)
+    where = destination.mention if destination else "本频道"
+    await interaction.response.send_message(f"🌐 已添加目标语言 **{language}** → {where}\n当前: {', '.join(languages)}", ephemeral=True)
+
+@bot.tree.command(name='remove_language', description='移除本频道的一种目标语言')
+async def remove_language(interaction: discord.Interaction, language: str):
+    cid = str(interaction.channel.id)
+    language = normalize_language_code(language.strip())
+    languages = dict(global_config["target_languages"].get(cid) or {DEFAULT_TARGET_LANGUAGE: None})
+    language = next((known for known in languages if known.lower() == language.lower()), language)
+    if language not in languages:
+        await interaction.response.send_message(f"⚠️ 本频道没有目标语言 `{language}`", ephemeral=True)
+        return
+    if len(languages) == 1:
+        await interaction.response.send_message("⚠️ 至少保留一种目标语言，关闭翻译请使用 /off_mode", ephemeral=True)
+        return
+    del languages[language]
+    global_config["target_languages"][cid] = languages
+    config_changed(cid)
+    await interaction.response.send_message(f"🗑️ 已移除目标语言 **{language}**\n当前: {', '.join(languages)}", ephemeral=True)
+
+GLOSSARY_SCOPES = [
+    discord.app_commands.Choice(name="本频道", value="channel"),
+    discord.app_commands.Choice(name="全局 (所有频道)", value="global")
+]
+
+def glossary_scope(interaction, scope):
+    return 'global' if scope and scope.value == 'global' else str(interaction.channel.id)
+
+@bot.tree.command(name='glossary_add', description='添加术语：不填译法则原样保留不翻译 (如股票代码、产品名)，填写则使用固定译法')
+@discord.app_commands.describe(term='术语原文', translation='固定译法 (留空表示不翻译)', language='固定译法对应的目标语言，默认 zh-CN',
+                               scope='作用范围，默认本频道')
+@discord.app_commands.choices(scope=GLOSSARY_SCOPES)
+async def glossary_add(interaction: discord.Interaction, term: str, translation: Optional[str] = None,
+                       language: Optional[str] = None, scope: Optional[discord.app_commands.Choice[str]] = None):
+    key = glossary_scope(interaction, scope)
+    term = term.strip()
+    if not term:
+        await interaction.response.send_message("⚠️ 术语不能为空", ephemeral=True)
+        return
+    language = normalize_language_code((language or DEFAULT_TARGET_LANGUAGE).strip())
+    if translation and not LANGUAGE_CODE_RE.match(language):
+        await interaction.response.send_message(f"⚠️ 无效的语言代码: `{language}`", ephemeral=True)
+        return
+    # 整体替换条目，不原地修改 (后台落盘只复制两层)
+    terms = dict(global_config["glossaries"].get(key) or {})
+    translations = dict(terms.get(term) or {})
+    if translation:
+        translations[language] = translation.strip()
+    terms[term] = translations
+    global_config["glossaries"][key] = terms
+    glossary_changed(key, term)
+    rule = f"译为 **{translation.strip()}** ({language})" if translation else "保留原文不翻译"
+    where = "全局" if key == 'global' else "本频道"
+    await interaction.response.send_message(f"📖 [{where}] `{term}` → {rule}", ephemeral=True)
+
+@bot.tree.command(name='glossary_remove', description='移除术语')
+@discord.app_commands.choices(scope=GLOSSARY_SCOPES)
+async def glossary_remove(interaction: discord.Interaction, term: str, scope: Optional[discord.app_commands.Choice[str]] = None):
+    key = glossary_scope(interaction, scope)
+    term = term.strip()
+    terms = dict(global_config["glossaries"].get(key) or {})
+    if term not in terms:
+        await interaction.response.send_message(f"⚠️ 未找到术语 `{term}`", ephemeral=True)
+        return
+    del terms[term]
+    if terms: global_config["glossaries"][key] = terms
+    else: del global_config["glossaries"][key]
+    glossary_changed(key, term)
+    await interaction.response.send_message(f"🗑️ 已移除术语 `{term}`", ephemeral=True)
+
+@bot.tree.command(name='glossary_list', description='查看全局和本频道的术语表')
+async def glossary_list(interaction: discord.Interaction):
+    lines = []
+    for key, title in (('global', '🌐 全局'), (str(interaction.channel.id), '📺 本频道')):
+        terms = global_config["glossaries"].get(key) or {}
+        if not terms: continue
+        lines.append(f"**{title}** ({len(terms)} 条)")
+        for term, translations in sorted(terms.items()):
+            rule = ", ".join(f"{lang}: {text}" for lang, text in translations.items()) or "不翻译"
+            lines.append(f"• `{term}` → {rule}")
+    text = "\n".join(lines) or "💤 没有设置任何术语"
+    await interaction.response.send_message(text[:1900], ephemeral=True)
+
 @bot.tree.command(name='start_translate', description='开启本频道全员自动翻译')
 async def start_translate(interaction: discord.Interaction):
     cid = str(interaction.channel.id)
     global_config["channel_modes"][cid] = 'replace'
-    save_config() 
+    config_changed(cid)
     await interaction.response.send_message('✅ 已开启全频道自动翻译', ephemeral=True)
 
+@bot.tree.command(name='start_mirror', description='开启本频道镜像翻译：保留原消息，原消息编辑/删除时同步更新译文')
+async def start_mirror(interaction: discord.Interaction):
+    cid = str(interaction.channel.id)
+    global_config["channel_modes"][cid] = 'mirror'
+    config_changed(cid)
+    await interaction.response.send_message('🪞 已开启镜像翻译：原消息保留，编辑和删除会同步到译文', ephemeral=True)
+
 @bot.tree.command(name='off_mode', description='关闭本频道自动翻译')
 async def off_mode(interaction: discord.Interaction):
     cid = str(interaction.channel.id)
     global_config["channel_modes"][cid] = 'off'
-    save_config() 
+    config_changed(cid)
     await interaction.response.send_message('🛑 全频道自动翻译已关闭', ephemeral=True)
 
 @bot.tree.context_menu(name='翻译此消息')
@@ -539,9 +2533,21 @@ async def get_raw_text(interaction: discord.Interaction, message: discord.Messag
 
 async def main():
     if not TOKEN:
-        print('❌ 错误: 未设置 DISCORD_TOKEN')
+        logger.error('❌ 错误: 未设置 DISCORD_TOKEN')
         return
-    await bot.start(TOKEN)
+    metrics_runner = await start_metrics_server()
+    # launcher.py 用 SIGTERM 停止分片进程：正常关闭连接并落盘，而不是直接被杀掉
+    try: asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError: pass
+    try:
+        await bot.start(TOKEN)
+    finally:
+        if metrics_runner: await metrics_runner.cleanup()
+        await close_translation_backend()
+        flush_config()
+        translation_cache.flush()
+        translation_cache.close()
+        relay_index.close()
 
 if __name__ == '__main__':
     asyncio.run(main())